@@ -0,0 +1,314 @@
+import random
+import string
+import threading
+from collections import deque
+from os import getenv
+from time import time
+
+from Mongo import DBClient
+from Storage import DuplicateKeyError
+
+# Database collection names
+ALERT_RULES_COLLECTION = getenv("SMART_SCHOOL_ALERT_RULES_COLL", "AlertRules")
+ALERTS_COLLECTION = getenv("SMART_SCHOOL_ALERTS_COLL", "Alerts")
+
+# Seconds after which alert rules are reloaded from the database
+RULE_REFRESH_TIME = float(getenv("SMART_SCHOOL_ALERT_RULE_REFRESH", 60))
+
+# Number of fixed width time buckets the window of a rule is split into,
+# so the rolling state of a rule has a constant size independent of the window and the rate of values
+WINDOW_BUCKETS = 60
+
+# Seconds after which rolling states of sensors, that didn't send values, are forgotten,
+# unless the window or duration of their rule is longer
+STATE_IDLE_TIME = float(getenv("SMART_SCHOOL_ALERT_STATE_IDLE", 3600))
+
+# Length of generated rule ids
+RULE_ID_LENGTH = 8
+
+# Sensor types alert rules can be defined for
+ALERT_TYPES = ("co2", "person")
+
+
+def isNumber(value) -> bool:
+    """
+    :return Boolean if value is an int or float, booleans aren't accepted as numbers
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class RuleState:
+
+    def __init__(self, firing:bool):
+        """
+        Creates rolling state of a rule for a single sensor
+
+        :param firing Boolean if an alert of this rule and sensor is currently active
+        """
+
+        self.firing = firing
+
+        # Time buckets within the rule's window as lists of bucket number, sum and count of their samples
+        # and sum and count of all samples within the window
+        self.buckets = deque()
+        self.sum = 0
+        self.count = 0
+
+        # Time since which the rule's condition is met and time of the last sample
+        self.exceeded_since = None
+        self.updated = None
+
+
+    def add(self, value:float, timestamp:float, window:float):
+        """
+        Adds sample to the bucket of it's time and removes buckets older than the window.
+        The window moves in steps of a bucket's width,
+        so the average is approximated by at most WINDOW_BUCKETS buckets.
+
+        :return Value to compare to the limit, which is the average of the window or the sample itself
+        """
+
+        self.updated = timestamp
+
+        # Using sample directly, if rule has no window
+        if window <= 0:
+            return value
+
+        # Adding sample to bucket of the current time, starting a new bucket if necessary
+        bucket = int(timestamp // (window / WINDOW_BUCKETS))
+        if self.buckets and self.buckets[-1][0] == bucket:
+            self.buckets[-1][1] += value
+            self.buckets[-1][2] += 1
+        else:
+            self.buckets.append([bucket, value, 1])
+
+        self.sum += value
+        self.count += 1
+
+        # Removing buckets, that left the window
+        while self.buckets[0][0] <= bucket - WINDOW_BUCKETS:
+            _, total, count = self.buckets.popleft()
+            self.sum -= total
+            self.count -= count
+
+        return self.sum / self.count
+
+
+class AlertManager:
+
+    def __init__(self, db_client:DBClient):
+        """
+        Creates alert manager evaluating alert rules on every incoming sensor value.
+        Rules define a "limit", that may not be exceeded by the sensor value or, if a "window" in seconds is set,
+        by the average of the values within the window. If a "duration" in seconds is set,
+        the limit has to be exceeded for that long before an alert is raised.
+        Rolling state of every rule and sensor is kept in memory, so values are never read back from the database.
+
+        :param db_client Database client object
+        """
+
+        self.database = db_client.getDataBase()
+
+        # Creating indexes for active alert lookups of sensors and rules and unique rule ids
+        self.database[ALERTS_COLLECTION].create_index(["id", "rule", "active"])
+        self.database[ALERTS_COLLECTION].create_index(["active"])
+        self.database[ALERT_RULES_COLLECTION].create_index(["rule"], unique=True)
+
+        # Rules by sensor type and time they were loaded
+        self.rules = {}
+        self.rules_loaded = 0
+
+        # Rolling state by rule id and sensor id
+        self.states = {}
+        self.lock = threading.Lock()
+
+
+    def getRules(self, type:str, id:str):
+        """
+        :return List of rules applying to sensor of given type and id
+        """
+
+        # Reloading rules from database and forgetting outdated states, if they are outdated
+        if time() - self.rules_loaded > RULE_REFRESH_TIME:
+            self.loadRules()
+            self.pruneStates()
+
+        return [rule for rule in self.rules.get(type, []) if rule.get("sensor") in (None, id)]
+
+
+    def loadRules(self):
+        """
+        Loads all rules from database grouped by sensor type
+        """
+
+        rules = {}
+        for rule in self.database[ALERT_RULES_COLLECTION].find({}, {"_id": False}):
+            rules.setdefault(rule["type"], []).append(rule)
+
+        self.rules = rules
+        self.rules_loaded = time()
+
+
+    def pruneStates(self):
+        """
+        Forgets rolling states of rules, that don't exist anymore,
+        and of sensors, that didn't send values for longer than the idle time, the window and duration of the rule.
+        States of active alerts are reloaded from the database, if the sensor sends values again.
+        """
+
+        rules = {rule["rule"]: rule for rules in self.rules.values() for rule in rules}
+        now = time()
+
+        def keep(key, state):
+            rule = rules.get(key[0])
+            return rule is not None and (state.updated is None or now - state.updated
+                                         <= max(STATE_IDLE_TIME, rule.get("window", 0), rule.get("duration", 0)))
+
+        with self.lock:
+            self.states = {key: state for key, state in self.states.items() if keep(key, state)}
+
+
+    def forgetSensors(self, ids:list):
+        """
+        Forgets rolling states of deleted sensors
+        """
+
+        ids = set(ids)
+        with self.lock:
+            self.states = {key: state for key, state in self.states.items() if key[1] not in ids}
+
+
+    def evaluate(self, id:str, type:str, value:float):
+        """
+        Evaluates every rule applying to the sensor with the new value.
+        Writes an active alert to the database, if a rule starts firing
+        and marks it as resolved, if the rule's condition isn't met anymore.
+        """
+
+        timestamp = time()
+        alerts_coll = self.database[ALERTS_COLLECTION]
+
+        for rule in self.getRules(type, id):
+            key = (rule["rule"], id)
+
+            # Looking up active alert in database outside of the lock for unknown states, so alerts survive restarts
+            firing = None
+            if key not in self.states:
+                firing = alerts_coll.count_documents({"id": id, "rule": rule["rule"], "active": True}) > 0
+
+            with self.lock:
+                state = self.states.get(key)
+
+                # Initializing state, unless another thread initialized it in the meantime.
+                # If the state has been dropped since the lookup, it's rule has been deleted and can't be active.
+                if state is None:
+                    state = RuleState(bool(firing))
+                    self.states[key] = state
+
+                current = state.add(value, timestamp, rule.get("window", 0))
+
+                # Tracking since when the limit has been exceeded
+                exceeded = current > rule["limit"]
+                if not exceeded:
+                    state.exceeded_since = None
+                elif state.exceeded_since is None:
+                    state.exceeded_since = timestamp
+
+                # Firing, if the limit has been exceeded for the duration of the rule
+                fire = (exceeded and not state.firing
+                        and timestamp - state.exceeded_since >= rule.get("duration", 0))
+                resolve = not exceeded and state.firing
+
+                if fire or resolve:
+                    state.firing = fire
+
+            # Writing state change to database
+            if fire:
+                alerts_coll.insert_one({"id": id, "rule": rule["rule"], "type": type, "limit": rule["limit"],
+                                        "value": current, "started": timestamp, "resolved": None, "active": True})
+
+            elif resolve:
+                query = {"id": id, "rule": rule["rule"], "active": True}
+                alerts_coll.update_one(query, {"$set": {"active": False, "resolved": timestamp}})
+
+
+    def addRule(self, type:str, limit:float, sensor:str=None, window:float=0, duration:float=0):
+        """
+        Adds rule for all sensors of given type or only the sensor of given id, if provided
+
+        :return Dictionary containing "status" and the "rule" id, if successful
+        """
+
+        # Checking rule parameters
+        if type not in ALERT_TYPES:
+            return {"status": "bad request", "hint": "Invalid sensor type!"}
+        if not all(isNumber(number) for number in (limit, window, duration)):
+            return {"status": "bad request", "hint": "Limit, window and duration have to be numbers!"}
+        if window < 0 or duration < 0:
+            return {"status": "bad request", "hint": "Window and duration may not be negative!"}
+        if sensor is not None and not isinstance(sensor, str):
+            return {"status": "bad request", "hint": "Sensor has to be a sensor id!"}
+
+        rule_doc = {"type": type, "sensor": sensor, "limit": limit, "window": window, "duration": duration}
+
+        while True:
+            rule_doc["rule"] = "".join(random.choices(list(string.ascii_uppercase + string.digits), k=RULE_ID_LENGTH))
+            try:
+                self.database[ALERT_RULES_COLLECTION].insert_one(rule_doc)
+                break
+
+            # Generating new rule id, if it's already taken by another rule
+            except DuplicateKeyError:
+                rule_doc.pop("_id", None)
+
+        rule_id = rule_doc["rule"]
+
+        # Forcing reload of rules with the next value
+        self.rules_loaded = 0
+
+        return {"status": "ok", "rule": rule_id}
+
+
+    def deleteRule(self, rule_id:str):
+        """
+        Deletes rule of given id and resolves it's active alerts
+        """
+
+        rules_coll = self.database[ALERT_RULES_COLLECTION]
+        query = {"rule": rule_id}
+
+        # Returning "not found" status, if rule doesn't exist
+        if rules_coll.count_documents(query) == 0:
+            return {"status": "not found"}
+
+        rules_coll.delete_one(query)
+
+        # Resolving active alerts of the rule
+        active_query = {"rule": rule_id, "active": True}
+        for alert in self.database[ALERTS_COLLECTION].find(active_query, {"id": True}):
+            self.database[ALERTS_COLLECTION].update_one(dict(active_query, id=alert["id"]),
+                                                        {"$set": {"active": False, "resolved": time()}})
+
+        # Forgetting rolling state of the rule and forcing reload of rules
+        with self.lock:
+            self.states = {key: state for key, state in self.states.items() if key[0] != rule_id}
+        self.rules_loaded = 0
+
+        return {"status": "ok"}
+
+
+    def listRules(self):
+        """
+        :return Dictionary containing "rules" as a list of all rules
+        """
+        return {"status": "ok", "rules": list(self.database[ALERT_RULES_COLLECTION].find({}, {"_id": False}))}
+
+
+    def listAlerts(self, id:str=None):
+        """
+        :return Dictionary containing "alerts" as a list of all alerts of the sensor with given id,
+            or all active alerts, if no id is provided
+        """
+
+        query = {"id": id} if id is not None else {"active": True}
+        return {"status": "ok", "alerts": list(self.database[ALERTS_COLLECTION].find(query, {"_id": False}))}
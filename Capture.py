@@ -0,0 +1,153 @@
+import hmac
+import json
+import queue
+import random
+import secrets
+import threading
+from hashlib import sha256
+from os import getenv
+from time import time
+
+# Traffic capture settings
+CAPTURE = getenv("SMART_SCHOOL_CAPTURE", "False") == "True"
+CAPTURE_RATE = float(getenv("SMART_SCHOOL_CAPTURE_RATE", 1.0))
+CAPTURE_FILE = getenv("SMART_SCHOOL_CAPTURE_FILE", "captured_requests.jsonl")
+
+# Handling of api and master keys, either "hash" to map them to stable pseudonyms or "redact" to remove them
+CAPTURE_KEYS = getenv("SMART_SCHOOL_CAPTURE_KEYS", "hash")
+
+# Secret pseudonyms of keys are derived with, a random secret is generated per recorder if it's empty
+CAPTURE_SECRET = getenv("SMART_SCHOOL_CAPTURE_SECRET", "")
+
+# Maximum number of records waiting to be written, further records are dropped
+CAPTURE_QUEUE_SIZE = int(getenv("SMART_SCHOOL_CAPTURE_QUEUE_SIZE", 10000))
+
+# Fields containing api or master keys
+SECRET_FIELDS = ("api", "key")
+
+
+def pseudonymize(key:str, secret:bytes) -> str:
+    """
+    :return Pseudonym of key, which can't be reversed or brute forced without the secret
+    """
+    return "k-" + hmac.new(secret, key.encode(), sha256).hexdigest()[:16]
+
+
+def maskSecrets(value, mode:str=CAPTURE_KEYS, secret:bytes=None):
+    """
+    Replaces values of secret fields in nested dictionaries and lists.
+    In "hash" mode every key is mapped to the same pseudonym, so captured traffic can be replayed with test keys.
+
+    :param mode Either "hash" or "redact"
+    :param secret Secret pseudonyms are derived with, required in "hash" mode
+    :return Copy of value with masked secrets
+    """
+
+    if isinstance(value, dict):
+        masked = {}
+        for field, item in value.items():
+            if field in SECRET_FIELDS and isinstance(item, str):
+                masked[field] = pseudonymize(item, secret) if mode == "hash" else "redacted"
+            else:
+                masked[field] = maskSecrets(item, mode, secret)
+        return masked
+
+    if isinstance(value, list):
+        return [maskSecrets(item, mode, secret) for item in value]
+
+    return value
+
+
+class TrafficRecorder:
+
+    def __init__(self, rate:float=CAPTURE_RATE, file:str=CAPTURE_FILE, secret:str=CAPTURE_SECRET):
+        """
+        Creates recorder appending a sample of requests and their responses to a json lines file.
+        Records are masked and written by a background thread, so requests only pay for queueing them.
+
+        :param rate Fraction of requests to capture
+        :param file Path of the capture file
+        :param secret Secret pseudonyms of keys are derived with. If it's empty a random secret is used,
+            so pseudonyms are only stable for the lifetime of the recorder and can't be mapped to keys
+        """
+
+        self.rate = rate
+        self.file = file
+        self.secret = secret.encode() if secret else secrets.token_bytes(32)
+
+        # Number of records dropped, because the queue was full
+        self.dropped = 0
+
+        # Starting background thread writing queued records
+        self.queue = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.write, daemon=True)
+        self.thread.start()
+
+
+    def capture(self, route:str, method:str, body, status:int, response):
+        """
+        Queues request for capturing, if it's sampled
+
+        :param route Path of the request
+        :param method HTTP method of the request
+        :param body Parsed json body of the request
+        :param status Status code of the response
+        :param response Raw body of the response, None if it isn't captured
+        """
+
+        if random.random() >= self.rate:
+            return
+
+        try:
+            self.queue.put_nowait((time(), route, method, body, status, response))
+        except queue.Full:
+            self.dropped += 1
+
+
+    def write(self):
+        """
+        Writes queued records to capture file, flushing whenever the queue is empty
+        """
+
+        with open(self.file, "a") as file:
+            while True:
+                timestamp, route, method, body, status, response = self.queue.get()
+
+                # Parsing json response, responses of other formats aren't captured
+                try:
+                    response = json.loads(response) if response is not None else None
+                except ValueError:
+                    response = None
+
+                record = {
+                    "time": timestamp,
+                    "route": route,
+                    "method": method,
+                    "body": maskSecrets(body, secret=self.secret),
+                    "status": status,
+                    "response": maskSecrets(response, secret=self.secret)
+                }
+                file.write(json.dumps(record) + "\n")
+
+                if self.queue.empty():
+                    file.flush()
+
+
+# Printing pseudonyms of keys for building mapping files for replays
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    # Load environment variables, so the capture secret of .env is used
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=".env")
+
+    parser = argparse.ArgumentParser(description="Prints mapping of pseudonyms in captured requests to given keys for replays")
+    parser.add_argument("keys", nargs="+", help="Api or master keys of the captured server")
+    args = parser.parse_args()
+
+    secret = getenv("SMART_SCHOOL_CAPTURE_SECRET", "")
+    if not secret:
+        sys.exit("SMART_SCHOOL_CAPTURE_SECRET has to be set to the secret used while capturing")
+
+    print(json.dumps({pseudonymize(key, secret.encode()): key for key in args.keys}, indent=4))
@@ -0,0 +1,183 @@
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from os import getenv
+
+# Brotli is only used, if it's installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression settings
+COMPRESSION = getenv("SMART_SCHOOL_COMPRESSION", "True") == "True"
+
+# Responses smaller than this size in bytes are sent uncompressed
+COMPRESSION_THRESHOLD = int(getenv("SMART_SCHOOL_COMPRESSION_THRESHOLD", 1024))
+
+# Maximum number of bytes of serialized and compressed responses kept in the compression cache
+COMPRESSION_CACHE_BYTES = int(getenv("SMART_SCHOOL_COMPRESSION_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Supported encodings in order of preference
+ENCODINGS = ("br", "gzip", "deflate") if brotli is not None else ("gzip", "deflate")
+
+
+def negotiateEncoding(accept_encoding:str):
+    """
+    Picks the supported encoding with the highest quality value from an Accept-Encoding header.
+    Encodings of equal quality are picked in order of preference.
+
+    :return Name of the encoding or None, if no supported encoding is accepted
+    """
+
+    # Parsing quality values of accepted encodings
+    qualities = {}
+    for part in accept_encoding.split(","):
+        encoding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[encoding.strip().lower()] = quality
+
+    # Applying quality of wildcard to encodings, that aren't listed
+    wildcard = qualities.get("*", 0.0)
+
+    best = None
+    best_quality = 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+
+    return best
+
+
+def compressBody(body:bytes, encoding:str) -> bytes:
+    """
+    :return Body compressed with given encoding
+    """
+
+    if encoding == "br":
+        return brotli.compress(body)
+
+    elif encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+
+    elif encoding == "deflate":
+        return zlib.compress(body, 6)
+
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class ResponseCompressor:
+
+    def __init__(self, threshold:int=COMPRESSION_THRESHOLD, cache_bytes:int=COMPRESSION_CACHE_BYTES):
+        """
+        Creates compressor for response bodies.
+        Compressed bodies are cached together with their serialized body,
+        so repeated responses aren't compressed again as long as the body doesn't change.
+
+        :param threshold Bodies smaller than this size in bytes are not compressed
+        :param cache_bytes Maximum number of bytes of serialized and compressed bodies kept in the cache
+        """
+
+        self.threshold = threshold
+        self.cache_bytes = cache_bytes
+
+        # Cache mapping response keys to the serialized body and it's compressed variants and their total size
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+        # Number of uncompressed and sent bytes per route
+        self.ratios = {}
+
+
+    def count(self, route:str, original:int, sent:int):
+        """
+        Counts bytes of a response for the compression ratio of the route
+        """
+
+        with self.lock:
+            sizes = self.ratios.setdefault(route, [0, 0])
+            sizes[0] += original
+            sizes[1] += sent
+
+
+    def resize(self, entry:list, size:int):
+        """
+        Adds size to cached entry and evicts least recently used entries, until the cache fits it's limit.
+        Has to be called while holding the lock.
+        """
+
+        entry[2] += size
+        self.cached_bytes += size
+
+        while self.cached_bytes > self.cache_bytes and self.cache:
+            self.cached_bytes -= self.cache.popitem(last=False)[1][2]
+
+
+    def compress(self, route:str, key, body:str, accept_encoding:str):
+        """
+        Compresses body with the best encoding accepted by the client, if it's large enough
+
+        :param route Route the response is sent from
+        :param key Hashable key identifying the response for caching
+        :param body Serialized response body
+        :param accept_encoding Accept-Encoding header of the request
+        :return Tuple of response body as bytes and the used encoding or None, if it's not compressed
+        """
+
+        body = body.encode()
+
+        # Sending small bodies and bodies for clients not accepting compression uncompressed
+        encoding = negotiateEncoding(accept_encoding) if len(body) >= self.threshold else None
+        if encoding is None:
+            self.count(route, len(body), len(body))
+            return body, None
+
+        with self.lock:
+            entry = self.cache.get(key)
+
+            # Replacing cache entry, if the body changed since it was cached
+            if entry is None or entry[0] != body:
+                if entry is not None:
+                    self.cached_bytes -= self.cache.pop(key)[2]
+                entry = [body, {}, 0]
+                self.cache[key] = entry
+                self.resize(entry, len(body))
+            else:
+                self.cache.move_to_end(key)
+
+            compressed = entry[1].get(encoding)
+
+        # Compressing body outside of lock, if it isn't cached in this encoding yet
+        if compressed is None:
+            compressed = compressBody(body, encoding)
+
+            # Adding compressed body to entry, if it hasn't been evicted or replaced in the meantime
+            with self.lock:
+                if self.cache.get(key) is entry and encoding not in entry[1]:
+                    entry[1][encoding] = compressed
+                    self.resize(entry, len(compressed))
+
+        self.count(route, len(body), len(compressed))
+
+        return compressed, encoding
+
+
+    def getRatios(self) -> dict:
+        """
+        :return Dictionary mapping routes to their uncompressed bytes and bytes actually sent,
+            including responses sent uncompressed, and the resulting compression ratio
+        """
+
+        with self.lock:
+            return {route: {"original": original, "compressed": compressed, "ratio": original / compressed}
+                    for route, (original, compressed) in self.ratios.items()}
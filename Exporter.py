@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+from os import getenv
+
+# Load environment variables, so collection names of .env are used when running as a command line tool
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=".env")
+
+# Database collection names
+PERSON_COUNTER_COLLECTION = getenv("SMART_SCHOOL_PERSON_COLL", "PersonCounters")
+CO2_SENSOR_COLLECTION = getenv("SMART_SCHOOL_CO2_COLL", "CO2Sensors")
+
+# Supported sensor types and export formats
+EXPORT_TYPES = ("co2", "person")
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Columns of exported csv files
+CSV_COLUMNS = ("type", "id", "time", "level", "count")
+
+# Approximate size in characters of chunks yielded by the exporter
+CHUNK_SIZE = 64 * 1024
+
+
+def exportRecords(database, types=EXPORT_TYPES, start:float=None, end:float=None):
+    """
+    Iterates threw all sensors of given types with a database cursor, so only one sensor document is held in memory.
+    CO2 sensors result in one record per stored level with "type", "id", "time" and "level".
+    Person counters result in one record with "type", "id" and "count".
+
+    :param database Storage backend database
+    :param types Sensor types to export
+    :param start Only levels measured at or after this time are exported, if provided
+    :param end Only levels measured at or before this time are exported, if provided
+    :return Generator of records as dictionaries
+    """
+
+    if "co2" in types:
+        for sensor_doc in database[CO2_SENSOR_COLLECTION].find({}, {"id": True, "levels": True}):
+
+            # Exporting levels in chronological order, skipping levels outside of the time range
+            for level in sorted(sensor_doc["levels"], key=lambda entry: entry["time"]):
+                if start is not None and level["time"] < start:
+                    continue
+                if end is not None and level["time"] > end:
+                    continue
+
+                yield {"type": "co2", "id": sensor_doc["id"], "time": level["time"], "level": level["level"]}
+
+    if "person" in types:
+        for sensor_doc in database[PERSON_COUNTER_COLLECTION].find({}, {"id": True, "count": True}):
+            yield {"type": "person", "id": sensor_doc["id"], "count": sensor_doc["count"]}
+
+
+def formatNDJSON(records):
+    """
+    :return Generator of chunks of newline delimited json, one record per line
+    """
+
+    chunk = []
+    size = 0
+
+    for record in records:
+        line = json.dumps(record) + "\n"
+        chunk.append(line)
+        size += len(line)
+
+        # Yielding chunk, if it reached the chunk size
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield "".join(chunk)
+
+
+def formatCSV(records):
+    """
+    :return Generator of chunks of csv, starting with a header line and containing one record per line
+    """
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+
+    for record in records:
+        writer.writerow(record)
+
+        # Yielding chunk, if it reached the chunk size
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell() > 0:
+        yield buffer.getvalue()
+
+
+def export(database, format:str="ndjson", types=EXPORT_TYPES, start:float=None, end:float=None):
+    """
+    Exports sensor data in given format as a stream of chunks
+
+    :return Generator of exported chunks as strings
+    """
+
+    records = exportRecords(database, types, start, end)
+
+    if format == "csv":
+        return formatCSV(records)
+
+    return formatNDJSON(records)
+
+
+# Exporting sensor data from database configured in environment
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from Mongo import DBClient
+
+    parser = argparse.ArgumentParser(description="Exports sensor data as newline delimited json or csv")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--type", choices=EXPORT_TYPES, action="append", dest="types",
+                        help="Sensor type to export, can be repeated. Defaults to all types")
+    parser.add_argument("--start", type=float, help="Export levels measured at or after this time seconds")
+    parser.add_argument("--end", type=float, help="Export levels measured at or before this time seconds")
+    parser.add_argument("--output", help="File to write to. Defaults to stdout")
+    args = parser.parse_args()
+
+    db_client = DBClient(getenv("SMART_SCHOOL_DB_CON", "mongodb://localhost:27017/"))
+    chunks = export(db_client.getDataBase(), args.format, args.types or EXPORT_TYPES, args.start, args.end)
+
+    # Writing chunks to output file or stdout
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    for chunk in chunks:
+        output.write(chunk)
+
+    if args.output:
+        output.close()
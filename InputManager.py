@@ -13,15 +13,18 @@ CO2_SENSOR_COLLECTION = getenv("SMART_SCHOOL_CO2_COLL", "CO2Sensors")
 
 class InputManager:
 
-    def __init__(self, api:str, db_client:DBClient):
+    def __init__(self, api:str, db_client:DBClient, alert_manager=None):
         """
         Creates input manager to manage requests to add data from sensors
         Sets api_valid attribute stating if apiKey is valid
 
         :param api APIKey send with the request
         :param db_client Database client object
+        :param alert_manager Alert manager object evaluating alert rules on new values, if provided
         """
 
+        self.alert_manager = alert_manager
+
         # Getting database and Clients collection
         self.database = db_client.getDataBase()
         client_coll = self.database[CLIENTS_COLLECTION]
@@ -52,7 +55,7 @@ class InputManager:
         # Replacing last heartbeat in database
         query = {"id": self.id}
         replace_data = {"heartbeat": time()}
-        client_coll.update(query, {"$set": replace_data})
+        client_coll.update_one(query, {"$set": replace_data})
 
 
     def handleRequest(self, json):
@@ -97,8 +100,7 @@ class InputManager:
 
             # Create new collection entry
             data = {"id": self.id, "count": count}
-            person_coll.insert(data)
-            return True
+            person_coll.insert_one(data)
 
         # If id is valid increment/decrement count in database
         else:
@@ -108,9 +110,13 @@ class InputManager:
 
             # Updating count in database
             replace_data = {"count": count}
-            person_coll.update(query, {"$set": replace_data})
+            person_coll.update_one(query, {"$set": replace_data})
+
+        # Evaluating alert rules with new count
+        if self.alert_manager is not None:
+            self.alert_manager.evaluate(self.id, self.type, count)
 
-            return True
+        return True
 
 
     def handleCO2Request(self, json):
@@ -141,7 +147,7 @@ class InputManager:
 
             # Create new collection entry
             data = {"id": self.id, "levels": [level]}
-            sensor_coll.insert(data)
+            sensor_coll.insert_one(data)
 
         # If id is valid update database entry
         else:
@@ -155,7 +161,11 @@ class InputManager:
 
             # Update levels in database
             replace_data = {"levels": levels}
-            sensor_coll.update(query, {"$set": replace_data})
+            sensor_coll.update_one(query, {"$set": replace_data})
+
+        # Evaluating alert rules with new co2 level
+        if self.alert_manager is not None:
+            self.alert_manager.evaluate(self.id, self.type, level["level"])
 
         return True
 
@@ -1,27 +1,164 @@
 from os import getenv
-from pymongo import MongoClient
+from pymongo import MongoClient, errors
+
+from Storage import Collection, Database, DuplicateKeyError, checkQuery, findDuplicates
 
 # Default database name to use
 DEFAULT_DATABASE = getenv("SMART_SCHOOL_DEFAULT_DB", "SmartSchool")
 
+# Storage backend to use, either "mongodb", "sharded" or "sqlite"
+DB_BACKEND = getenv("SMART_SCHOOL_DB_BACKEND", "mongodb")
+
+# Path of the database file used by the sqlite backend
+SQLITE_PATH = getenv("SMART_SCHOOL_SQLITE_PATH", "SmartSchool.db")
+
+# Whitespace separated list of "name=connection" pairs of shards used by the sharded backend
+DB_SHARDS = getenv("SMART_SCHOOL_DB_SHARDS", "")
+
+# Database collection names
+CLIENTS_COLLECTION = getenv("SMART_SCHOOL_CLIENTS_COLL", "Clients")
+PERSON_COUNTER_COLLECTION = getenv("SMART_SCHOOL_PERSON_COLL", "PersonCounters")
+CO2_SENSOR_COLLECTION = getenv("SMART_SCHOOL_CO2_COLL", "CO2Sensors")
+
+def parseShards(shards:str):
+    """
+    Parses whitespace separated list of "name=connection" pairs.
+    Shard names decide the placement of sensors, so they must not change once data is stored.
+
+    :return Dictionary mapping shard names to mongodb connection strings
+    """
+
+    pairs = [pair.partition("=") for pair in shards.split()]
+    return {name: connection for name, _, connection in pairs}
+
+class MongoCollection(Collection):
+
+    def __init__(self, collection):
+        """
+        Creates storage backend collection backed by given pymongo collection
+        """
+        self.collection = collection
+
+    def find_one(self, query:dict):
+        checkQuery(query)
+        return self.collection.find_one(query)
+
+    def find(self, query:dict, projection:dict=None):
+        checkQuery(query)
+        return self.collection.find(query, projection)
+
+    def count_documents(self, query:dict):
+        checkQuery(query)
+        return self.collection.count_documents(query)
+
+    def insert_one(self, document:dict):
+        try:
+            self.collection.insert_one(document)
+        except errors.DuplicateKeyError as error:
+            raise DuplicateKeyError(str(error)) from error
+
+    def insert_many(self, documents:list):
+        try:
+            self.collection.insert_many(documents)
+        except errors.BulkWriteError as error:
+
+            # Translating duplicate key errors, every other write error is raised as is
+            if any(write_error["code"] == 11000 for write_error in error.details.get("writeErrors", [])):
+                raise DuplicateKeyError(str(error)) from error
+            raise
+
+    def update_one(self, query:dict, update:dict):
+        checkQuery(query)
+        return self.collection.update_one(query, update).matched_count
+
+    def delete_one(self, query:dict):
+        checkQuery(query)
+        self.collection.delete_one(query)
+
+    def delete_many(self, query:dict):
+        checkQuery(query)
+        self.collection.delete_many(query)
+
+    def create_index(self, fields:list, unique:bool=False):
+        try:
+            self.collection.create_index([(field, 1) for field in fields], unique=unique)
+        except errors.OperationFailure as error:
+
+            # Translating duplicate key errors of unique indexes, every other error is raised as is
+            if error.code == 11000:
+                raise DuplicateKeyError(str(error)) from error
+            raise
+
+
+class MongoDatabase(Database):
+
+    def __init__(self, database):
+        """
+        Creates storage backend database backed by given pymongo database
+        """
+        self.database = database
+
+    def __getitem__(self, name:str) -> MongoCollection:
+        return MongoCollection(self.database[name])
+
+
 class DBClient:
 
-    def __init__(self, connection):
+    def __init__(self, connection, backend=DB_BACKEND):
         """
-        Initializing database with given mongodb connection string.
+        Initializing database with given mongodb connection string,
+        or with the embedded sqlite database, if sqlite backend is selected.
         """
-        self.client = MongoClient(connection)
+        self.backend = backend
+
+        if backend == "sqlite":
+            from SQLite import SQLiteDatabase
+            self.client = None
+            self.database = SQLiteDatabase(SQLITE_PATH)
+
+        elif backend == "sharded":
+            from Sharding import ShardedDatabase
+
+            # Using given connection for the key directory and every other not sharded collection
+            self.client = MongoClient(connection)
+
+            # Connecting to every shard, each with it's own connection pool
+            self.shard_clients = {name: MongoClient(shard_connection)
+                                  for name, shard_connection in parseShards(DB_SHARDS).items()}
+            shards = {name: MongoDatabase(client[DEFAULT_DATABASE]) for name, client in self.shard_clients.items()}
+
+            self.database = ShardedDatabase(shards, MongoDatabase(self.client[DEFAULT_DATABASE]),
+                                            [CLIENTS_COLLECTION, PERSON_COUNTER_COLLECTION, CO2_SENSOR_COLLECTION],
+                                            CLIENTS_COLLECTION)
+
+        elif backend == "mongodb":
+            self.client = MongoClient(connection)
+            self.database = MongoDatabase(self.client[DEFAULT_DATABASE])
+
+        else:
+            raise ValueError(f"Unknown database backend: {backend}")
+
+        # Ensuring sensor ids are unique, so concurrently created sensors can't share an id
+        try:
+            self.database[CLIENTS_COLLECTION].create_index(["id"], unique=True)
+
+        # Reporting sensors sharing an id, that have been created before ids were checked, instead of failing
+        except DuplicateKeyError:
+            duplicates = findDuplicates(self.database[CLIENTS_COLLECTION], "id")
+            print("WARNING: Unique index on sensor ids can't be created, since multiple sensors share an id: "
+                  + ", ".join(f"{id} ({count} sensors)" for id, count in duplicates.items()))
+            print("Run \"python Rebalance.py --dedupe\" to assign new ids to the colliding sensors")
 
     def getClient(self):
         """
-        :return MongoDB client object
+        :return MongoDB client object, None if sqlite backend is used.
+            If sharded backend is used, client of the directory database is returned
         """
         return self.client
 
-    def getDataBase(self):
+    def getDataBase(self) -> Database:
         """
-        :return MongoDB database of default name
+        :return Storage backend database of default name
         """
-        return self.client[DEFAULT_DATABASE]
-
+        return self.database
 
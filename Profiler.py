@@ -0,0 +1,385 @@
+import cProfile
+import json
+import logging
+import marshal
+import pstats
+import random
+import sys
+import threading
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from os import getenv, path
+from time import perf_counter, sleep, time
+
+from Storage import Collection, Database
+
+# Profiling settings
+PROFILE = getenv("SMART_SCHOOL_PROFILE", "False") == "True"
+PROFILE_RATE = float(getenv("SMART_SCHOOL_PROFILE_RATE", 0.01))
+
+# Requests taking longer than this threshold in milliseconds are written to the slow request log
+SLOW_THRESHOLD = float(getenv("SMART_SCHOOL_SLOW_THRESHOLD", 500))
+
+# Slow request log file and it's rotation settings
+SLOW_LOG = getenv("SMART_SCHOOL_SLOW_LOG", "slow_requests.log")
+SLOW_LOG_SIZE = int(getenv("SMART_SCHOOL_SLOW_LOG_SIZE", 10 * 1024 * 1024))
+SLOW_LOG_BACKUPS = int(getenv("SMART_SCHOOL_SLOW_LOG_BACKUPS", 5))
+
+# Milliseconds between samples of the stacks of all requests, so slow requests can be profiled after the fact.
+# Sampling is disabled, if set to 0
+SAMPLE_INTERVAL = float(getenv("SMART_SCHOOL_PROFILE_SAMPLE_INTERVAL", 10))
+
+# Maximum number of stack frames kept per sample and number of most frequent stacks written per slow request
+SAMPLE_DEPTH = 64
+SAMPLE_STACKS = 20
+
+
+class StackSampler:
+
+    def __init__(self, interval:float=SAMPLE_INTERVAL):
+        """
+        Creates sampler periodically recording the stacks of threads handling requests.
+        Only registered threads are sampled, so the overhead doesn't depend on the number of idle threads.
+
+        :param interval Milliseconds between samples
+        """
+
+        self.interval = interval / 1000
+
+        # Sampled stacks and their counts by id of the registered threads
+        self.samples = {}
+        self.lock = threading.Lock()
+
+        # Starting background thread sampling the registered threads
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    @staticmethod
+    def fold(frame) -> str:
+        """
+        :return Stack of given frame in folded format, outermost frame first and frames separated by semicolons
+        """
+
+        frames = []
+        while frame is not None and len(frames) < SAMPLE_DEPTH:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+
+        return ";".join(reversed(frames))
+
+
+    def run(self):
+        """
+        Samples stacks of all registered threads every interval
+        """
+
+        while True:
+            sleep(self.interval)
+
+            with self.lock:
+                if not self.samples:
+                    continue
+
+                frames = sys._current_frames()
+                for thread, stacks in self.samples.items():
+                    frame = frames.get(thread)
+                    if frame is not None:
+                        stacks[self.fold(frame)] += 1
+
+
+    def start(self):
+        """
+        Starts sampling the current thread
+        """
+        with self.lock:
+            self.samples[threading.get_ident()] = Counter()
+
+
+    def stop(self) -> Counter:
+        """
+        Stops sampling the current thread
+
+        :return Counter of sampled stacks in folded format
+        """
+        with self.lock:
+            return self.samples.pop(threading.get_ident(), Counter())
+
+
+class ProfiledCollection(Collection):
+
+    def __init__(self, collection, name:str, profiler):
+        """
+        Creates collection timing every call to the wrapped collection
+        and reporting it to the profiler's current request
+
+        :param collection Wrapped storage backend collection
+        :param name Name of the collection
+        :param profiler Profiler object calls are reported to
+        """
+
+        self.collection = collection
+        self.name = name
+        self.profiler = profiler
+
+
+    def timed(self, operation:str, method, *args):
+        """
+        Calls method with given arguments and reports the time it took
+        """
+
+        start = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.profiler.recordCall(self.name, operation, perf_counter() - start)
+
+
+    def timedIteration(self, cursor, duration:float):
+        """
+        Iterates threw cursor and reports the time spent fetching documents,
+        once the cursor is exhausted or the iteration is stopped
+
+        :param cursor Iterable returned by the wrapped collection
+        :param duration Time it took to create the cursor in seconds
+        """
+
+        iterator = iter(cursor)
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    document = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    duration += perf_counter() - start
+
+                yield document
+
+        finally:
+            self.profiler.recordCall(self.name, "find", duration)
+
+
+    def find_one(self, query:dict):
+        return self.timed("find_one", self.collection.find_one, query)
+
+
+    def find(self, query:dict, projection:dict=None):
+
+        # Timing creation of the cursor and every fetched document, since cursors are read lazily
+        start = perf_counter()
+        cursor = self.collection.find(query, projection)
+        return self.timedIteration(cursor, perf_counter() - start)
+
+
+    def count_documents(self, query:dict):
+        return self.timed("count_documents", self.collection.count_documents, query)
+
+
+    def insert_one(self, document:dict):
+        return self.timed("insert_one", self.collection.insert_one, document)
+
+
+    def insert_many(self, documents:list):
+        return self.timed("insert_many", self.collection.insert_many, documents)
+
+
+    def update_one(self, query:dict, update:dict):
+        return self.timed("update_one", self.collection.update_one, query, update)
+
+
+    def delete_one(self, query:dict):
+        return self.timed("delete_one", self.collection.delete_one, query)
+
+
+    def delete_many(self, query:dict):
+        return self.timed("delete_many", self.collection.delete_many, query)
+
+
+    def create_index(self, fields:list, unique:bool=False):
+        return self.timed("create_index", self.collection.create_index, fields, unique)
+
+
+class ProfiledDatabase(Database):
+
+    def __init__(self, database:Database, profiler):
+        """
+        Creates database timing every call to collections of the wrapped database
+
+        :param database Wrapped storage backend database
+        :param profiler Profiler object calls are reported to
+        """
+
+        self.database = database
+        self.profiler = profiler
+
+
+    def __getitem__(self, name:str) -> Collection:
+        return ProfiledCollection(self.database[name], name, self.profiler)
+
+
+class Profiler:
+
+    def __init__(self, rate:float=PROFILE_RATE, threshold:float=SLOW_THRESHOLD, log_file:str=SLOW_LOG,
+                 sample_interval:float=SAMPLE_INTERVAL):
+        """
+        Creates request profiler timing every request and profiling a fraction of them with cProfile.
+        Requests slower then the threshold are written to a rotating log as json records.
+        Since it's only known after a request, if it's slow, the stacks of every request are sampled
+        and the most frequent stacks are added to the records of slow requests.
+
+        :param rate Fraction of requests to profile with cProfile
+        :param threshold Time in milliseconds after which requests are logged as slow
+        :param log_file Path of the slow request log
+        :param sample_interval Milliseconds between stack samples, 0 to disable sampling
+        """
+
+        self.rate = rate
+        self.threshold = threshold
+
+        # Sampler recording stacks of all requests, if enabled
+        self.sampler = StackSampler(sample_interval) if sample_interval > 0 else None
+
+        # Data about the request handled by the current thread
+        self.local = threading.local()
+
+        # Aggregated profile stats per route
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+        # Only one cProfile profiler can be active at a time
+        self.profile_lock = threading.Lock()
+
+        # Creating logger writing slow request records to rotating log files
+        self.logger = logging.getLogger("SmartSchool.slow_requests")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = RotatingFileHandler(log_file, maxBytes=SLOW_LOG_SIZE, backupCount=SLOW_LOG_BACKUPS)
+        self.logger.addHandler(handler)
+
+
+    def instrument(self, db_client):
+        """
+        Wraps database of given db client, so calls to the database are timed
+        """
+        db_client.database = ProfiledDatabase(db_client.database, self)
+
+
+    def begin(self):
+        """
+        Starts timing the request handled by the current thread and profiles it, if it's sampled
+        """
+
+        self.local.start = perf_counter()
+        self.local.calls = []
+        self.local.sensor = None
+        self.local.profile = None
+
+        # Sampling stacks of every request
+        if self.sampler is not None:
+            self.sampler.start()
+
+        # Profiling sampled requests, if no other request is profiled at the moment
+        if random.random() < self.rate and self.profile_lock.acquire(blocking=False):
+            self.local.profile = cProfile.Profile()
+            self.local.profile.enable()
+
+
+    def annotate(self, sensor:str):
+        """
+        Sets id of the sensor the current request refers to
+        """
+        self.local.sensor = sensor
+
+
+    def recordCall(self, collection:str, operation:str, duration:float):
+        """
+        Records database call of the current request
+        """
+
+        calls = getattr(self.local, "calls", None)
+        if calls is not None:
+            calls.append({"collection": collection, "operation": operation, "ms": duration * 1000})
+
+
+    def end(self, route:str, status:int):
+        """
+        Finishes timing the current request, aggregates it's profile
+        and writes a slow request record, if it took longer then the threshold
+        """
+
+        # Ignoring requests, that haven't been started
+        start = getattr(self.local, "start", None)
+        if start is None:
+            return
+
+        total = (perf_counter() - start) * 1000
+        profile = self.local.profile
+        self.local.start = None
+
+        # Stopping stack sampling of the request
+        stacks = self.sampler.stop() if self.sampler is not None else Counter()
+
+        # Stopping profiler and adding profile to the stats of the route
+        if profile is not None:
+            profile.disable()
+            self.profile_lock.release()
+
+            with self.stats_lock:
+                if route in self.stats:
+                    self.stats[route].add(profile)
+                else:
+                    self.stats[route] = pstats.Stats(profile)
+
+        # Returning, if request isn't slow
+        if total < self.threshold:
+            return
+
+        # Writing timing breakdown to slow request log
+        db_time = sum(call["ms"] for call in self.local.calls)
+        record = {
+            "time": time(),
+            "route": route,
+            "status": status,
+            "sensor": self.local.sensor,
+            "total_ms": total,
+            "db_ms": db_time,
+            "other_ms": total - db_time,
+            "profiled": profile is not None,
+            "calls": self.local.calls,
+            "samples": sum(stacks.values()),
+            "stacks": dict(stacks.most_common(SAMPLE_STACKS))
+        }
+        self.logger.info(json.dumps(record))
+
+
+    def dumpStats(self, route:str=None, reset:bool=False):
+        """
+        Dumps aggregated profile stats in the format written by pstats, readable by pstats and snakeviz
+
+        :param route Route to dump stats of, stats of all routes are combined, if None
+        :param reset Clears aggregated stats after dumping them, if True
+        :return Marshaled stats as bytes, None if no profile has been recorded
+        """
+
+        with self.stats_lock:
+
+            # Collecting stats of requested routes
+            if route is None:
+                stats = list(self.stats.values())
+            else:
+                stats = [self.stats[route]] if route in self.stats else []
+
+            if not stats:
+                return None
+
+            # Combining stats of all requested routes
+            combined = pstats.Stats()
+            combined.add(*stats)
+
+            if reset:
+                self.stats.clear()
+
+            return marshal.dumps(combined.stats)
@@ -0,0 +1,148 @@
+import threading
+from collections import Counter, OrderedDict
+from os import getenv
+from time import monotonic
+
+# Rate limiting settings
+RATE_LIMIT = getenv("SMART_SCHOOL_RATE_LIMIT", "False") == "True"
+
+# Allowed requests per second and burst size per api key
+RATE_DEFAULT = float(getenv("SMART_SCHOOL_RATE_DEFAULT", 1))
+RATE_BURST = float(getenv("SMART_SCHOOL_RATE_BURST", 10))
+
+# Allowed requests per second per api key by sensor type
+RATE_BY_TYPE = {
+    "co2": float(getenv("SMART_SCHOOL_RATE_CO2", RATE_DEFAULT)),
+    "person": float(getenv("SMART_SCHOOL_RATE_PERSON", RATE_DEFAULT))
+}
+
+# Allowed requests per second and burst size per ip address
+RATE_IP = float(getenv("SMART_SCHOOL_RATE_IP", 20))
+RATE_IP_BURST = float(getenv("SMART_SCHOOL_RATE_IP_BURST", 50))
+
+# Maximum number of tracked keys and seconds after which idle keys are forgotten
+RATE_MAX_KEYS = int(getenv("SMART_SCHOOL_RATE_MAX_KEYS", 10000))
+RATE_IDLE_TIME = float(getenv("SMART_SCHOOL_RATE_IDLE_TIME", 600))
+
+# Maximum number of tracked api keys, that haven't been confirmed to be valid yet
+RATE_MAX_UNKNOWN_KEYS = int(getenv("SMART_SCHOOL_RATE_MAX_UNKNOWN_KEYS", 1000))
+
+
+class TokenBucketLimiter:
+
+    def __init__(self, rate:float, burst:float, max_keys:int=RATE_MAX_KEYS, idle_time:float=RATE_IDLE_TIME,
+                 max_unknown_keys:int=None):
+        """
+        Creates in memory rate limiter keeping one token bucket per key.
+        Buckets are kept in least recently used order, so idle and surplus buckets are evicted in constant time.
+        If max_unknown_keys is set, buckets of keys are kept in a separate small cache until they are
+        confirmed by identify(), so floods of invalid keys can't evict the buckets of known keys.
+
+        :param rate Tokens added to every bucket per second
+        :param burst Maximum number of tokens in a bucket
+        :param max_keys Maximum number of buckets kept in memory
+        :param idle_time Seconds after which buckets of unused keys are evicted
+        :param max_unknown_keys Maximum number of buckets of unconfirmed keys, None to treat every key as known
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_time = idle_time
+        self.max_unknown_keys = max_unknown_keys
+
+        # Buckets stored as lists of tokens, last update, rate and label of the key
+        self.buckets = OrderedDict()
+        self.unknown = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Number of rejected requests per label
+        self.rejected = Counter()
+
+
+    def evict(self, buckets:OrderedDict, now:float):
+        """
+        Evicts buckets, that haven't been used for longer then the idle time
+        """
+
+        while buckets:
+            bucket = next(iter(buckets.values()))
+            if now - bucket[1] < self.idle_time:
+                break
+            buckets.popitem(last=False)
+
+
+    def allow(self, key) -> bool:
+        """
+        Takes token from bucket of given key, creating a full bucket if key is unknown
+
+        :return Boolean if request is allowed
+        """
+
+        with self.lock:
+            now = monotonic()
+            self.evict(self.buckets, now)
+            self.evict(self.unknown, now)
+
+            # Looking up bucket in known and unknown keys
+            buckets = self.buckets
+            if key not in buckets and self.max_unknown_keys is not None:
+                buckets = self.unknown
+
+            bucket = buckets.get(key)
+
+            # Creating full bucket and evicting least recently used one, if there are too many
+            if bucket is None:
+                bucket = [self.burst, now, self.rate, None]
+                buckets[key] = bucket
+                max_keys = self.max_keys if buckets is self.buckets else self.max_unknown_keys
+                if len(buckets) > max_keys:
+                    buckets.popitem(last=False)
+
+            # Refilling bucket according to time passed since last request
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * bucket[2])
+                bucket[1] = now
+
+            # Allowing request, if a token is left
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+
+            # Counting rejected request for label of the key
+            self.rejected[bucket[3]] += 1
+            return False
+
+
+    def identify(self, key, label:str, rate:float=None):
+        """
+        Confirms key, sets label rejected requests of given key are counted for
+        and changes rate of it's bucket, if provided
+        """
+
+        with self.lock:
+
+            bucket = self.buckets.get(key)
+
+            # Moving bucket of unknown key to known keys, recreating it with the request's token taken,
+            # if it has been evicted from the unknown keys in the meantime
+            if bucket is None:
+                bucket = self.unknown.pop(key, None) or [self.burst - 1, monotonic(), self.rate, None]
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+
+            bucket[3] = label
+            if rate is not None:
+                bucket[2] = rate
+
+
+    def getRejected(self) -> dict:
+        """
+        :return Dictionary mapping labels to the number of rejected requests,
+            requests of unidentified keys are counted as "unknown"
+        """
+
+        with self.lock:
+            return {label if label is not None else "unknown": count for label, count in self.rejected.items()}
@@ -0,0 +1,214 @@
+from os import getenv
+from time import time
+
+# Load environment variables
+from dotenv import load_dotenv
+load_dotenv(dotenv_path=".env")
+
+from pymongo import MongoClient
+
+from Mongo import DBClient, MongoDatabase, CLIENTS_COLLECTION, DEFAULT_DATABASE
+from SensorManager import SensorManager
+from Storage import findDuplicates
+
+# MongoDB connection string of the directory database
+DB_CON = getenv("SMART_SCHOOL_DB_CON", "mongodb://localhost:27017/")
+
+# Seconds since the last heartbeat of any sensor, after which the server is considered to be stopped
+STOPPED_TIME = 2 * 60
+
+
+def checkStopped(clients_coll):
+    """
+    Raises RuntimeError, if any sensor sent a heartbeat recently, which means the server is still running.
+    Moving documents while the server is running would replace data written on their new shard in the meantime.
+
+    :param clients_coll Collection of sensors to check
+    """
+
+    recent = time() - STOPPED_TIME
+    if any(document.get("heartbeat", 0) > recent for document in clients_coll.find({}, {"heartbeat": True})):
+        raise RuntimeError(f"Sensors sent heartbeats within the last {STOPPED_TIME} seconds, "
+                           "stop the server before moving documents or pass --force")
+
+
+def rebalance(database, dry_run=False, force=False):
+    """
+    Moves every sensor document stored on a shard, that isn't responsible for the sensor's id anymore,
+    to the shard it's routed to by the current hash ring. Used after shards have been added.
+    Documents are replaced on the new shard before being deleted from the old one,
+    so an interrupted run can safely be repeated.
+    The server has to be stopped while rebalancing, which is checked by the heartbeats of the sensors.
+
+    :param database Sharded database object
+    :param dry_run Only count documents to move, if True
+    :param force Moves documents, even if sensors sent heartbeats recently
+    :return Dictionary mapping collection names to the number of moved documents
+    """
+
+    if not dry_run and not force:
+        checkStopped(database[database.keyed_collection])
+
+    moved = {}
+
+    for name in database.routed_collections:
+        moved[name] = 0
+
+        for shard, shard_database in database.shards.items():
+            source = shard_database[name]
+
+            # Iterating threw all documents stored on the shard
+            for document in source.find({}, {"_id": False}):
+                target = database.ring.route(document["id"])
+
+                # Skipping documents, that are already placed correctly
+                if target == shard:
+                    continue
+
+                moved[name] += 1
+                if dry_run:
+                    continue
+
+                # Copying document to responsible shard and removing it from the old one
+                target_coll = database.shards[target][name]
+                target_coll.delete_many({"id": document["id"]})
+                target_coll.insert_one(document)
+                source.delete_one({"id": document["id"]})
+
+    return moved
+
+
+def bootstrap(source, database, dry_run=False, force=False):
+    """
+    Copies every sensor document of a not sharded database onto the shard it's routed to
+    and registers the api keys of all sensors in the directory.
+    Used when switching an existing deployment to the sharded backend.
+    Documents already stored unchanged on their shard are skipped, so an interrupted run can safely be repeated.
+    The source database is left unchanged.
+    The server has to be stopped while bootstrapping, which is checked by the heartbeats of the sensors.
+
+    :param source Storage backend database used before sharding
+    :param database Sharded database object
+    :param dry_run Only count documents to copy, if True
+    :param force Copies documents, even if sensors sent heartbeats recently
+    :return Dictionary mapping collection names to the number of copied documents
+    """
+
+    if not dry_run and not force:
+        checkStopped(source[database.keyed_collection])
+        checkStopped(database[database.keyed_collection])
+
+    # Refusing to copy sensors sharing an id, since they would replace each other on their shard
+    duplicates = findDuplicates(source[database.keyed_collection], "id")
+    if duplicates:
+        raise ValueError(f"Multiple sensors share the ids {', '.join(map(str, duplicates))}, "
+                         "run --dedupe on the not sharded database first")
+
+    copied = {}
+
+    for name in database.routed_collections:
+        copied[name] = 0
+
+        # Iterating threw all documents of the old database
+        for document in source[name].find({}, {"_id": False}):
+            target_coll = database.shards[database.ring.route(document["id"])][name]
+
+            # Registering api key in directory
+            if name == database.keyed_collection and not dry_run:
+                database.directory.delete_many({"key": document["key"]})
+                database.directory.insert_one({"key": document["key"], "id": document["id"]})
+
+            # Skipping documents, that are already stored on their shard
+            stored = target_coll.find_one({"id": document["id"]})
+            if stored is not None and {field: value for field, value in stored.items() if field != "_id"} == document:
+                continue
+
+            copied[name] += 1
+            if dry_run:
+                continue
+
+            # Replacing document on responsible shard
+            target_coll.delete_many({"id": document["id"]})
+            target_coll.insert_one(document)
+
+    return copied
+
+
+def dedupe(db_client:DBClient, dry_run=False):
+    """
+    Assigns new ids to sensors sharing their id with other sensors, which were created before ids were checked,
+    and creates the unique index on sensor ids afterwards.
+    The first sensor of every id keeps the id and it's stored data, since sensors sharing an id
+    have written their data into the same documents. The other sensors start without data.
+    Sensors keep their api keys, so they don't need to be reconfigured.
+    Not supported by the sharded backend, the database has to be deduplicated before bootstrapping instead.
+
+    :param db_client Database client of a not sharded backend
+    :param dry_run Only list sensors to change, if True
+    :return List of dictionaries containing the "old" and new "id" and the "type" of every changed sensor
+    """
+
+    # Refusing sharded backend, since changed ids would have to be moved to other shards
+    if db_client.backend == "sharded":
+        raise ValueError("Sharded databases can't be deduplicated, deduplicate before bootstrapping")
+
+    clients_coll = db_client.getDataBase()[CLIENTS_COLLECTION]
+    changed = []
+
+    for id in findDuplicates(clients_coll, "id"):
+
+        # Keeping id for the first sensor and generating new ids for all others
+        sensor_docs = list(clients_coll.find({"id": id}, {"key": True, "type": True}))[1:]
+        new_ids = SensorManager(db_client).generateIds(len(sensor_docs))
+
+        for sensor_doc, new_id in zip(sensor_docs, new_ids):
+            changed.append({"old": id, "id": new_id, "type": sensor_doc["type"]})
+
+            # Identifying sensor by it's api key, since it's id isn't unique
+            if not dry_run:
+                clients_coll.update_one({"key": sensor_doc["key"]}, {"$set": {"id": new_id}})
+
+    # Creating unique index, now that every id is unique
+    if not dry_run:
+        clients_coll.create_index(["id"], unique=True)
+
+    return changed
+
+
+# Rebalancing shards configured in environment
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Moves sensors to the shards they are routed to or deduplicates sensor ids")
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents to move")
+    parser.add_argument("--bootstrap", action="store_true",
+                        help="Copy sensors of a not sharded database onto the shards and fill the key directory")
+    parser.add_argument("--source", default=DB_CON,
+                        help="MongoDB connection string of the not sharded database used by --bootstrap")
+    parser.add_argument("--force", action="store_true",
+                        help="Move documents, even if sensors sent heartbeats recently and the server may be running")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Assign new ids to sensors sharing an id in the database of the configured backend")
+    args = parser.parse_args()
+
+    # Deduplicating sensor ids of the configured not sharded database
+    if args.dedupe:
+        for sensor in dedupe(DBClient(DB_CON), dry_run=args.dry_run):
+            print(f"{sensor['type']} sensor {sensor['old']}: {'to change to' if args.dry_run else 'changed to'} "
+                  f"{sensor['id']}")
+        raise SystemExit
+
+    db_client = DBClient(DB_CON, backend="sharded")
+
+    # Copying data of the not sharded database, if bootstrapping
+    if args.bootstrap:
+        source = MongoDatabase(MongoClient(args.source)[DEFAULT_DATABASE])
+        result = bootstrap(source, db_client.getDataBase(), dry_run=args.dry_run, force=args.force)
+        verb = "to copy" if args.dry_run else "copied"
+
+    else:
+        result = rebalance(db_client.getDataBase(), dry_run=args.dry_run, force=args.force)
+        verb = "to move" if args.dry_run else "moved"
+
+    for name, count in result.items():
+        print(f"{name}: {count} documents {verb}")
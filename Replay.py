@@ -0,0 +1,218 @@
+import argparse
+import http.client
+import json
+import math
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+from Capture import maskSecrets, SECRET_FIELDS
+
+# Response fields containing timestamps, values depending on timing or keys, which are ignored when comparing
+VOLATILE_FIELDS = ("heartbeat", "online", "time", "started", "resolved", "value") + SECRET_FIELDS
+
+# Response fields containing ids, which are only compared, if they have been sent with the request,
+# since ids generated by the server differ between runs
+GENERATED_FIELDS = ("id", "rule")
+
+
+def loadRecords(file:str):
+    """
+    :return List of captured records sorted by time
+    """
+
+    with open(file) as capture_file:
+        records = [json.loads(line) for line in capture_file if line.strip()]
+
+    return sorted(records, key=lambda record: record["time"])
+
+
+def mapSecrets(value, mapping:dict):
+    """
+    Replaces pseudonyms of captured keys with keys of the test database
+
+    :return Copy of value with mapped keys
+    """
+
+    if isinstance(value, dict):
+        return {field: mapSecrets(item, mapping) for field, item in value.items()}
+
+    if isinstance(value, list):
+        return [mapSecrets(item, mapping) for item in value]
+
+    if isinstance(value, str):
+        return mapping.get(value, value)
+
+    return value
+
+
+def collectValues(value):
+    """
+    :return Set of all strings contained in nested dictionaries and lists
+    """
+
+    if isinstance(value, dict):
+        return set().union(*(collectValues(item) for item in value.values()))
+
+    if isinstance(value, list):
+        return set().union(*(collectValues(item) for item in value))
+
+    if isinstance(value, str):
+        return {value}
+
+    return set()
+
+
+def stripVolatile(value, requested:set):
+    """
+    :param requested Set of strings sent with the request, generated ids are kept, if they are contained
+    :return Copy of response without fields, that differ between runs
+    """
+
+    if isinstance(value, dict):
+        return {field: stripVolatile(item, requested) for field, item in value.items()
+                if field not in VOLATILE_FIELDS and (field not in GENERATED_FIELDS or item in requested)}
+
+    if isinstance(value, list):
+        return [stripVolatile(item, requested) for item in value]
+
+    return value
+
+
+def percentile(values:list, fraction:float):
+    """
+    :return Value at given fraction of sorted values using the nearest rank
+    """
+
+    index = max(0, math.ceil(fraction * len(values)) - 1)
+    return values[index]
+
+
+def send(server:str, record:dict, mapping:dict, timeout:float=30):
+    """
+    Sends captured request to the server
+
+    :return Tuple of latency in milliseconds, status code and parsed json response or None.
+        Status code is 0, if the server couldn't be reached, timed out or closed the connection
+    """
+
+    body = json.dumps(mapSecrets(record["body"], mapping)).encode()
+    request = urllib.request.Request(server.rstrip("/") + record["route"], data=body, method=record["method"],
+                                     headers={"Content-Type": "application/json"})
+
+    start = perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, data = response.status, response.read()
+    except urllib.error.HTTPError as error:
+        status, data = error.code, error.read()
+    except (OSError, http.client.HTTPException):
+        status, data = 0, b""
+    latency = (perf_counter() - start) * 1000
+
+    try:
+        data = json.loads(data)
+    except ValueError:
+        data = None
+
+    return latency, status, data
+
+
+def replay(records:list, server:str, speed:float=1.0, mapping:dict=None, workers:int=32):
+    """
+    Sends captured requests to the server keeping their original spacing divided by speed.
+    A speed of 0 sends all requests as fast as possible.
+
+    :return Dictionary mapping routes to lists of latencies in milliseconds, list of response differences
+        and counter of failed requests per route, that didn't get a response
+    """
+
+    mapping = mapping or {}
+    latencies = {}
+    diffs = []
+    errors = Counter()
+    lock = threading.Lock()
+
+    def run(record):
+        latency, status, response = send(server, record, mapping)
+
+        # Counting requests without response as errors instead of differences
+        if status == 0:
+            with lock:
+                errors[record["route"]] += 1
+            return
+
+        # Removing keys from response, so they aren't printed with differences
+        response = maskSecrets(response, "redact")
+
+        # Comparing response bodies only, if the response has been captured
+        differs = status != record["status"]
+        if record["response"] is not None:
+            requested = collectValues(record["body"])
+            differs = differs or stripVolatile(response, requested) != stripVolatile(record["response"], requested)
+
+        with lock:
+            latencies.setdefault(record["route"], []).append(latency)
+
+            if differs:
+                diffs.append({"route": record["route"], "body": record["body"],
+                              "expected": [record["status"], record["response"]],
+                              "actual": [status, response]})
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = perf_counter()
+        first = records[0]["time"] if records else 0
+
+        for record in records:
+
+            # Waiting for the scaled time of the request relative to the first one
+            if speed > 0:
+                delay = (record["time"] - first) / speed - (perf_counter() - start)
+                if delay > 0:
+                    sleep(delay)
+
+            futures.append((record["route"], pool.submit(run, record)))
+
+    # Counting requests failing with unexpected errors
+    for route, future in futures:
+        if future.exception() is not None:
+            errors[route] += 1
+
+    return latencies, diffs, errors
+
+
+# Replaying captured traffic against a test server
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replays captured requests against a test server")
+    parser.add_argument("capture", help="Capture file written by the server in capture mode")
+    parser.add_argument("--server", default="http://localhost:99", help="Base url of the test server")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Speed up factor of the original timing, 0 to send as fast as possible")
+    parser.add_argument("--mapping", help="Json file mapping captured key pseudonyms to keys of the test database")
+    parser.add_argument("--workers", type=int, default=32, help="Maximum number of concurrent requests")
+    parser.add_argument("--diffs", type=int, default=10, help="Number of response differences to print")
+    args = parser.parse_args()
+
+    mapping = None
+    if args.mapping:
+        with open(args.mapping) as mapping_file:
+            mapping = json.load(mapping_file)
+
+    latencies, diffs, errors = replay(loadRecords(args.capture), args.server, args.speed, mapping, args.workers)
+
+    # Printing latency percentiles per route
+    print(f"{'route':<16}{'count':>8}{'errors':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for route in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(route, []))
+        print(f"{route:<16}{len(values):>8}{errors[route]:>8}" + "".join(
+            f"{percentile(values, fraction):>10.1f}" if values else f"{'-':>10}"
+            for fraction in (0.5, 0.9, 0.99, 1.0)))
+
+    # Printing response differences
+    print(f"\n{len(diffs)} responses differ from the captured ones")
+    for diff in diffs[:args.diffs]:
+        print(json.dumps(diff))
@@ -0,0 +1,256 @@
+import json
+import re
+import sqlite3
+import threading
+
+from Storage import Collection, Database, DuplicateKeyError, checkQuery
+
+# Fields stored in their own indexed columns, every other field is only stored in the document
+INDEXED_FIELDS = ("id", "key")
+
+# Pattern field names have to match, so they can be used in json paths of sql statements
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class SQLiteCollection(Collection):
+
+    def __init__(self, database, name:str):
+        """
+        Creates collection stored in the SQLite table of given name.
+        Creates table and indexes on "id" and "key", if they don't exist yet.
+
+        :param database SQLite database object the collection belongs to
+        :param name Name of the collection and table
+        """
+
+        self.database = database
+        self.name = name
+        self.table = '"' + name.replace('"', '""') + '"'
+
+        # Creating table storing indexed fields in columns and the whole document as json
+        with self.database.connection() as connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                               "(id TEXT, key TEXT, doc TEXT NOT NULL)")
+            for field in INDEXED_FIELDS:
+                index = '"' + f"{name}_{field}".replace('"', '""') + '"'
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {self.table} ({field})")
+
+
+    def column(self, field:str):
+        """
+        :return SQL expression of given field, which is it's column or it's value extracted from the json document
+        """
+
+        # Refusing field names, that can't safely be used in sql statements
+        if not FIELD_PATTERN.match(field):
+            raise ValueError(f"Unsupported field name: {field}")
+
+        if field in INDEXED_FIELDS:
+            return field
+
+        return f"json_extract(doc, '$.{field}')"
+
+
+    def buildWhere(self, query:dict):
+        """
+        Translates query into an SQL where clause with placeholders.
+        Raises ValueError, if query contains unsupported operators.
+
+        :return Tuple of where clause and list of parameters
+        """
+
+        checkQuery(query)
+
+        clauses = []
+        params = []
+
+        for field, value in query.items():
+            column = self.column(field)
+
+            # Matching any of the listed values
+            if isinstance(value, dict):
+                values = list(value["$in"])
+
+                # Matching no document, if list of values to match is empty
+                if not values:
+                    clauses.append("0")
+                    continue
+
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+
+            # Matching single value
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+
+        if not clauses:
+            return "", params
+
+        return " WHERE " + " AND ".join(clauses), params
+
+
+    def toRow(self, document:dict):
+        """
+        :return Tuple of column values for given document
+        """
+        return tuple(document.get(field) for field in INDEXED_FIELDS) + (json.dumps(document),)
+
+
+    def find_one(self, query:dict):
+        where, params = self.buildWhere(query)
+        row = self.database.connection().execute(
+            f"SELECT doc FROM {self.table}{where} LIMIT 1", params).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+
+    def find(self, query:dict, projection:dict=None):
+        where, params = self.buildWhere(query)
+        cursor = self.database.connection().execute(f"SELECT doc FROM {self.table}{where}", params)
+
+        for row in cursor:
+            document = json.loads(row[0])
+
+            # Keeping only included fields or removing excluded fields, if projection is provided
+            if projection:
+                if any(projection.values()):
+                    document = {field: value for field, value in document.items() if projection.get(field)}
+                else:
+                    document = {field: value for field, value in document.items() if field not in projection}
+
+            yield document
+
+
+    def count_documents(self, query:dict):
+        where, params = self.buildWhere(query)
+        row = self.database.connection().execute(
+            f"SELECT COUNT(*) FROM {self.table}{where}", params).fetchone()
+        return row[0]
+
+
+    def insert_one(self, document:dict):
+        try:
+            with self.database.connection() as connection:
+                connection.execute(f"INSERT INTO {self.table} (id, key, doc) VALUES (?, ?, ?)",
+                                   self.toRow(document))
+        except sqlite3.IntegrityError as error:
+            raise DuplicateKeyError(str(error)) from error
+
+
+    def insert_many(self, documents:list):
+        try:
+            with self.database.connection() as connection:
+                connection.executemany(f"INSERT INTO {self.table} (id, key, doc) VALUES (?, ?, ?)",
+                                       [self.toRow(document) for document in documents])
+        except sqlite3.IntegrityError as error:
+            raise DuplicateKeyError(str(error)) from error
+
+
+    def update_one(self, query:dict, update:dict):
+        where, where_params = self.buildWhere(query)
+
+        # Setting every field inside the json document and in it's column, if it has one,
+        # so concurrent updates of different fields don't overwrite each other
+        paths = []
+        params = []
+        columns = ""
+        for field, value in update["$set"].items():
+            self.column(field)
+            paths.append(f"'$.{field}', json(?)")
+            params.append(json.dumps(value))
+
+        for field in INDEXED_FIELDS:
+            if field in update["$set"]:
+                columns += f", {field} = ?"
+                params.append(update["$set"][field])
+
+        doc = f"json_set(doc, {', '.join(paths)})" if paths else "doc"
+
+        with self.database.connection() as connection:
+            cursor = connection.execute(f"UPDATE {self.table} SET doc = {doc}{columns} "
+                                        f"WHERE rowid = (SELECT rowid FROM {self.table}{where} LIMIT 1)",
+                                        params + where_params)
+
+        return cursor.rowcount
+
+
+    def delete_one(self, query:dict):
+        where, params = self.buildWhere(query)
+
+        with self.database.connection() as connection:
+            connection.execute(f"DELETE FROM {self.table} WHERE rowid = "
+                               f"(SELECT rowid FROM {self.table}{where} LIMIT 1)", params)
+
+
+    def delete_many(self, query:dict):
+        where, params = self.buildWhere(query)
+
+        with self.database.connection() as connection:
+            connection.execute(f"DELETE FROM {self.table}{where}", params)
+
+
+    def create_index(self, fields:list, unique:bool=False):
+        columns = [self.column(field) for field in fields]
+
+        # Naming index after it's table, fields and uniqueness
+        name = "_".join([self.name] + list(fields) + (["unique"] if unique else []))
+        index = '"' + name.replace('"', '""') + '"'
+
+        try:
+            with self.database.connection() as connection:
+                connection.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index} "
+                                   f"ON {self.table} ({', '.join(columns)})")
+        except sqlite3.IntegrityError as error:
+            raise DuplicateKeyError(str(error)) from error
+
+
+class SQLiteDatabase(Database):
+
+    def __init__(self, path:str):
+        """
+        Creates embedded SQLite database stored in file at given path.
+        Every thread uses it's own connection, the database is used in WAL mode,
+        so reading threads aren't blocked by writing ones.
+
+        :param path Path of the database file
+        """
+
+        self.path = path
+        self.local = threading.local()
+        self.collections = {}
+        self.lock = threading.Lock()
+
+        # Switching database to WAL mode, which is persisted in the database file
+        self.connection().execute("PRAGMA journal_mode=WAL")
+
+
+    def connection(self):
+        """
+        :return SQLite connection of the current thread
+        """
+
+        connection = getattr(self.local, "connection", None)
+
+        # Opening new connection, if current thread has none yet
+        if connection is None:
+            # Allowing cursors to be iterated by other threads, which sharded scans prefetching in a pool do.
+            # New statements are still only executed by this thread.
+            connection = sqlite3.connect(self.path, timeout=30, cached_statements=256, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+
+        return connection
+
+
+    def __getitem__(self, name:str) -> SQLiteCollection:
+
+        # Creating collection only once, so tables and indexes are checked once per name
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = SQLiteCollection(self, name)
+
+        return self.collections[name]
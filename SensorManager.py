@@ -3,6 +3,7 @@ import string
 from os import getenv
 
 from Mongo import DBClient
+from Storage import DuplicateKeyError
 
 # Length of generated api keys and ids
 KEY_LENGTH = 30
@@ -15,6 +16,10 @@ PERSON_COUNTER_COLLECTION = getenv("SMART_SCHOOL_PERSON_COLL", "PersonCounters")
 CO2_SENSOR_COLLECTION = getenv("SMART_SCHOOL_CO2_COLL", "CO2Sensors")
 
 
+# Maximum number of sensors handled by a single bulk request
+BULK_LIMIT = 1000
+
+
 class SensorManager:
     
 
@@ -52,6 +57,55 @@ class SensorManager:
             self.master = False
 
 
+    def generateKey(self):
+        """
+        Generates random api key of length KEY_LENGTH
+        """
+
+        # Getting chars for generation of api key as char array
+        key_chars = list(string.ascii_letters + string.digits)
+
+        # Generating random api key and converting it into a string
+        return "".join(random.choices(key_chars, k=KEY_LENGTH))
+
+
+    def generateIds(self, count:int):
+        """
+        Generates given number of random sensor ids of length ID_LENGTH.
+        Ids are guaranteed to be distinct and to not collide with ids already stored in the database.
+
+        :return List of generated ids
+        """
+
+        # Getting clients collection from database
+        clients_coll = self.database[CLIENTS_COLLECTION]
+
+        # Getting chars for generation of ids as char array
+        id_chars = list(string.ascii_uppercase)
+
+        # Set of ids that are free to use
+        ids = set()
+
+        while len(ids) < count:
+
+            # Generating candidates for all missing ids
+            candidates = set()
+            while len(candidates) < count - len(ids):
+                candidate = "".join(random.choices(id_chars, k=ID_LENGTH))
+                if candidate not in ids:
+                    candidates.add(candidate)
+
+            # Crawling database for candidates already in use
+            query = {"id": {"$in": list(candidates)}}
+            taken = clients_coll.find(query, {"id": True})
+
+            # Keeping candidates that aren't taken, others are regenerated in next iteration
+            candidates -= {doc["id"] for doc in taken}
+            ids |= candidates
+
+        return list(ids)
+
+
     def create(self, type:str):
         """
         Creates new sensor of given type and returns it's id and api key in
@@ -63,30 +117,33 @@ class SensorManager:
         if not self.master:
             return {"status": "access denied", "hint": "Master key is required!"}
 
-        # Getting clients collection from database
-        clients_coll = self.database[CLIENTS_COLLECTION]
+        # Creating document for sensor with random api key and an id not yet in use
+        sensor_doc = {"id": self.generateIds(1)[0], "key": self.generateKey(), "type": type}
+
+        # Inserting document into the database
+        self.insertSensor(sensor_doc)
 
-        # Getting chars for generation of api key and id
-        key_chars = string.ascii_letters + string.digits
-        id_chars = string.ascii_uppercase
+        return {"status": "ok", "id": sensor_doc["id"], "api": sensor_doc["key"]}
 
-        # Converting strings into char arrays
-        key_chars = list(key_chars)
-        id_chars = list(id_chars)
 
-        # Generating random api key and id
-        api_key = random.choices(key_chars, k=KEY_LENGTH)
-        id = random.choices(id_chars, k=ID_LENGTH)
+    def insertSensor(self, sensor_doc:dict):
+        """
+        Inserts sensor document into the database.
+        If another sensor with the same id has been inserted since the id was generated,
+        the unique index on "id" rejects the document and it's retried with a new id.
+        """
 
-        # Converting char arrays into strings
-        api_key = "".join(api_key)
-        id = "".join(id)
+        # Getting clients collection from database
+        clients_coll = self.database[CLIENTS_COLLECTION]
 
-        # Creating document for sensor and inserting it into the database
-        sensor_doc = {"id": id, "key": api_key, "type": type}
-        clients_coll.insert(sensor_doc)
+        while True:
+            try:
+                clients_coll.insert_one(sensor_doc)
+                return
 
-        return {"status": "ok", "id": id, "api": api_key}
+            # Generating new id, if id has been taken in the meantime
+            except DuplicateKeyError:
+                sensor_doc["id"] = self.generateIds(1)[0]
 
 
     def destroy(self, id):
@@ -189,3 +246,143 @@ class SensorManager:
         query = {"id": id}
         person_coll.delete_one(query)
 
+
+    def createMany(self, type:str, count:int):
+        """
+        Creates given number of new sensors of given type and returns their ids and api keys
+        in the field "sensors" as a list of dictionaries containing "id" and "api".
+        Requires master privileges to have ben granted.
+        """
+
+        # Denying access, if master privileges haven't ben granted
+        if not self.master:
+            return {"status": "access denied", "hint": "Master key is required!"}
+
+        # Checking if count is a valid integer within the bulk limit
+        if not isinstance(count, int) or isinstance(count, bool) or not 0 < count <= BULK_LIMIT:
+            return {"status": "bad request", "hint": f"Count has to be between 1 and {BULK_LIMIT}!"}
+
+        # Getting clients collection from database
+        clients_coll = self.database[CLIENTS_COLLECTION]
+
+        # Creating documents for all sensors with ids not yet in use
+        sensor_docs = [{"id": id, "key": self.generateKey(), "type": type}
+                       for id in self.generateIds(count)]
+
+        # Inserting all documents into the database at once
+        try:
+            clients_coll.insert_many(sensor_docs)
+
+        # Retrying documents, that weren't inserted, one by one, if an id has been taken in the meantime
+        except DuplicateKeyError:
+
+            # Crawling database for documents that have been inserted before the error
+            query = {"id": {"$in": [doc["id"] for doc in sensor_docs]}}
+            inserted = {doc["id"]: doc["key"] for doc in clients_coll.find(query, {"id": True, "key": True})}
+
+            for sensor_doc in sensor_docs:
+                if inserted.get(sensor_doc["id"]) != sensor_doc["key"]:
+                    self.insertSensor(sensor_doc)
+
+        # Creating per sensor results
+        sensors = [{"status": "ok", "id": doc["id"], "api": doc["key"]} for doc in sensor_docs]
+
+        return {"status": "ok", "sensors": sensors}
+
+
+    def checkIds(self, ids):
+        """
+        Checks if ids is a valid list of sensor ids within the bulk limit
+
+        :return Dictionary containing "bad request" status, if ids are invalid, otherwise None
+        """
+
+        if(not isinstance(ids, list)
+                or not 0 < len(ids) <= BULK_LIMIT
+                or not all(isinstance(id, str) for id in ids)):
+            return {"status": "bad request", "hint": f"Ids have to be a list of 1 to {BULK_LIMIT} ids!"}
+
+        return None
+
+
+    def fetchSensors(self, ids):
+        """
+        Crawls clients collection for all sensors with given ids
+
+        :return Dictionary mapping found ids to their sensor documents
+        """
+
+        # Getting clients collection from database
+        clients_coll = self.database[CLIENTS_COLLECTION]
+
+        # Crawling database for all sensors at once
+        query = {"id": {"$in": ids}}
+        return {doc["id"]: doc for doc in clients_coll.find(query)}
+
+
+    def destroyMany(self, ids):
+        """
+        Deletes sensors with given ids as well as their stored data.
+        Response contains "sensors" as a list of dictionaries containing "id" and "status" per sensor.
+        Requires master privileges to have ben granted.
+        """
+
+        # Denying access, if master privileges haven't ben granted
+        if not self.master:
+            return {"status": "access denied", "hint": "Master key is required!"}
+
+        # Returning "bad request" status, if ids are invalid
+        error = self.checkIds(ids)
+        if error is not None:
+            return error
+
+        # Getting sensors that exist in database
+        sensor_docs = self.fetchSensors(ids)
+        found = list(sensor_docs)
+
+        # Deleting sensors and cascading deletion to their data
+        if found:
+            query = {"id": {"$in": found}}
+            self.database[CLIENTS_COLLECTION].delete_many(query)
+            self.database[CO2_SENSOR_COLLECTION].delete_many(query)
+            self.database[PERSON_COUNTER_COLLECTION].delete_many(query)
+
+        # Creating per sensor results
+        sensors = [{"id": id, "status": "ok" if id in sensor_docs else "not found"} for id in ids]
+
+        return {"status": "ok", "sensors": sensors}
+
+
+    def resetMany(self, ids):
+        """
+        Resets sensors with given ids.
+        Response contains "sensors" as a list of dictionaries containing "id" and "status" per sensor.
+        Requires master privileges to have ben granted.
+        """
+
+        # Denying access, if master privileges haven't ben granted
+        if not self.master:
+            return {"status": "access denied", "hint": "Master key is required!"}
+
+        # Returning "bad request" status, if ids are invalid
+        error = self.checkIds(ids)
+        if error is not None:
+            return error
+
+        # Getting sensors that exist in database
+        sensor_docs = self.fetchSensors(ids)
+
+        # Grouping found ids by sensor type
+        co2_ids = [id for id, doc in sensor_docs.items() if doc["type"] == "co2"]
+        person_ids = [id for id, doc in sensor_docs.items() if doc["type"] == "person"]
+
+        # Deleting data according to sensor type
+        if co2_ids:
+            self.database[CO2_SENSOR_COLLECTION].delete_many({"id": {"$in": co2_ids}})
+        if person_ids:
+            self.database[PERSON_COUNTER_COLLECTION].delete_many({"id": {"$in": person_ids}})
+
+        # Creating per sensor results
+        sensors = [{"id": id, "status": "ok" if id in sensor_docs else "not found"} for id in ids]
+
+        return {"status": "ok", "sensors": sensors}
@@ -0,0 +1,330 @@
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import md5
+from itertools import chain, islice
+from os import getenv
+
+from Storage import Collection, Database, DuplicateKeyError
+
+# Number of points every shard is placed on the hash ring
+VIRTUAL_NODES = 128
+
+# Number of threads shared by all requests for fanning out queries to the shards
+FAN_OUT_WORKERS = int(getenv("SMART_SCHOOL_SHARD_WORKERS", 32))
+
+# Number of documents read from every shard in parallel, before iterating a scan over all shards
+PREFETCH_SIZE = 100
+
+# Name of the collection mapping api keys to sensor ids
+DIRECTORY_COLLECTION = "KeyDirectory"
+
+
+class HashRing:
+
+    def __init__(self, shards:list):
+        """
+        Creates consistent hash ring over given shard names.
+        Adding a shard only moves the ids, that are now closest to one of the new shard's points.
+
+        :param shards List of shard names
+        """
+
+        self.points = []
+        self.shards = {}
+
+        # Placing every shard on the ring multiple times to even out the distribution
+        for shard in shards:
+            for i in range(VIRTUAL_NODES):
+                point = self.hash(f"{shard}#{i}")
+                self.points.append(point)
+                self.shards[point] = shard
+
+        self.points.sort()
+
+
+    @staticmethod
+    def hash(value:str):
+        """
+        :return Position of given value on the ring as an integer
+        """
+        return int(md5(value.encode()).hexdigest()[:16], 16)
+
+
+    def route(self, id:str):
+        """
+        :return Name of the shard responsible for given id
+        """
+
+        # Finding the next point on the ring, wrapping around at the end
+        index = bisect(self.points, self.hash(id)) % len(self.points)
+        return self.shards[self.points[index]]
+
+
+class ShardedCollection(Collection):
+
+    def __init__(self, database, name:str):
+        """
+        Creates collection spread across all shards of the database by the "id" field of it's documents
+
+        :param database Sharded database object the collection belongs to
+        :param name Name of the collection
+        """
+
+        self.database = database
+        self.name = name
+
+        # Api keys of documents are only resolvable for the keyed collection
+        self.keyed = name == database.keyed_collection
+
+
+    def shard(self, shard:str):
+        """
+        :return Collection of this name on given shard
+        """
+        return self.database.shards[shard][self.name]
+
+
+    def target(self, query:dict):
+        """
+        Determines the shards, that may contain documents matching query
+
+        :return Dictionary mapping shard names to the query to run on them
+        """
+
+        id = query.get("id")
+
+        # Routing to single shard, if query matches a single id
+        if isinstance(id, str):
+            return {self.database.ring.route(id): query}
+
+        # Splitting list of ids into one query per shard
+        if isinstance(id, dict) and "$in" in id:
+            groups = {}
+            for value in id["$in"]:
+                groups.setdefault(self.database.ring.route(value), []).append(value)
+            return {shard: dict(query, id={"$in": ids}) for shard, ids in groups.items()}
+
+        # Resolving sensor id of api key through the directory
+        if self.keyed and isinstance(query.get("key"), str):
+            entry = self.database.directory.find_one({"key": query["key"]})
+            if entry is None:
+                return {}
+            return {self.database.ring.route(entry["id"]): dict(query, id=entry["id"])}
+
+        # Fanning out to every shard, if query isn't routable
+        return {shard: query for shard in self.database.shards}
+
+
+    def fanOut(self, function, targets:dict):
+        """
+        Calls function with every shard name and it's query in parallel
+
+        :return List of results in order of targets
+        """
+
+        # Calling function directly, if only one shard is targeted
+        if len(targets) == 1:
+            return [function(*next(iter(targets.items())))]
+
+        # Waiting for every shard to finish, before raising the first error
+        futures = [self.database.pool.submit(function, *item) for item in targets.items()]
+        wait(futures)
+
+        return [future.result() for future in futures]
+
+
+    def find_one(self, query:dict):
+        results = self.fanOut(lambda shard, query: self.shard(shard).find_one(query), self.target(query))
+        return next((document for document in results if document is not None), None)
+
+
+    def find(self, query:dict, projection:dict=None):
+        targets = self.target(query)
+
+        # Reading lookups of ids from all targeted shards in parallel, since their results are bounded
+        if all("id" in query for query in targets.values()):
+            return chain.from_iterable(self.fanOut(
+                lambda shard, query: list(self.shard(shard).find(query, projection)), targets))
+
+        # Opening cursors of unbounded scans on all shards in parallel, further documents are only read while iterated
+        futures = [self.database.pool.submit(self.prefetch, shard, query, projection)
+                   for shard, query in targets.items()]
+        return self.scan(futures)
+
+
+    def prefetch(self, shard:str, query:dict, projection:dict):
+        """
+        Opens cursor on given shard and reads it's first documents
+
+        :return Tuple of list of prefetched documents and the cursor of the remaining documents
+        """
+
+        cursor = iter(self.shard(shard).find(query, projection))
+        return list(islice(cursor, PREFETCH_SIZE)), cursor
+
+
+    @staticmethod
+    def scan(futures:list):
+        """
+        :return Generator of prefetched and remaining documents of every shard in order of futures
+        """
+
+        for future in futures:
+            documents, cursor = future.result()
+            yield from documents
+            yield from cursor
+
+
+    def count_documents(self, query:dict):
+        return sum(self.fanOut(lambda shard, query: self.shard(shard).count_documents(query),
+                               self.target(query)))
+
+
+    def insert_one(self, document:dict):
+        self.shard(self.database.ring.route(document["id"])).insert_one(document)
+
+        # Registering api key in directory
+        if self.keyed:
+            self.database.directory.insert_one({"key": document["key"], "id": document["id"]})
+
+
+    def insert_many(self, documents:list):
+
+        # Grouping documents by their shard
+        groups = {}
+        for document in documents:
+            groups.setdefault(self.database.ring.route(document["id"]), []).append(document)
+
+        try:
+            self.fanOut(lambda shard, documents: self.shard(shard).insert_many(documents), groups)
+
+        # Registering api keys of documents inserted before a duplicate key error
+        except DuplicateKeyError:
+            if self.keyed:
+                query = {"id": {"$in": [document["id"] for document in documents]}}
+                inserted = {document["id"]: document["key"]
+                            for document in self.find(query, {"id": True, "key": True})}
+                self.registerKeys([document for document in documents
+                                   if inserted.get(document["id"]) == document["key"]])
+            raise
+
+        # Registering api keys in directory
+        if self.keyed:
+            self.registerKeys(documents)
+
+
+    def registerKeys(self, documents:list):
+        """
+        Registers api keys of given documents in the directory
+        """
+        if documents:
+            self.database.directory.insert_many(
+                [{"key": document["key"], "id": document["id"]} for document in documents])
+
+
+    def update_one(self, query:dict, update:dict):
+
+        # Refusing to change ids, since documents would have to be moved to the shard of their new id
+        if "id" in update["$set"]:
+            raise ValueError("Ids of sharded documents can't be changed")
+
+        # Updating document by it's id and replacing it's directory entry, if it's api key is changed
+        if self.keyed and "key" in update["$set"]:
+            document = self.find_one(query)
+            if document is None:
+                return 0
+
+            matched = self.shard(self.database.ring.route(document["id"])).update_one({"id": document["id"]}, update)
+            self.database.directory.delete_many({"id": document["id"]})
+            self.database.directory.insert_one({"key": update["$set"]["key"], "id": document["id"]})
+            return matched
+
+        # Updating first matching document only, so shards are tried one by one
+        for shard, query in self.target(query).items():
+            matched = self.shard(shard).update_one(query, update)
+            if matched > 0:
+                return matched
+
+        return 0
+
+
+    def delete_one(self, query:dict):
+
+        # Fetching document first, so it's shard and directory entry are known
+        document = self.find_one(query)
+        if document is None:
+            return
+
+        self.shard(self.database.ring.route(document["id"])).delete_one({"id": document["id"]})
+
+        # Removing api key from directory
+        if self.keyed:
+            self.database.directory.delete_many({"id": document["id"]})
+
+
+    def delete_many(self, query:dict):
+        targets = self.target(query)
+
+        # Collecting ids of deleted documents for cleaning up the directory
+        if self.keyed:
+            ids = [document["id"] for document in self.find(query, {"id": True})]
+
+        self.fanOut(lambda shard, query: self.shard(shard).delete_many(query), targets)
+
+        # Removing api keys from directory
+        if self.keyed and ids:
+            self.database.directory.delete_many({"id": {"$in": ids}})
+
+
+    def create_index(self, fields:list, unique:bool=False):
+
+        # Creating index on every shard, unique indexes including "id" are unique across shards,
+        # since every id is routed to one shard
+        self.fanOut(lambda shard, fields: self.shard(shard).create_index(fields, unique),
+                    {shard: fields for shard in self.database.shards})
+
+
+class ShardedDatabase(Database):
+
+    def __init__(self, shards:dict, directory:Database, routed_collections:list, keyed_collection:str,
+                 workers:int=FAN_OUT_WORKERS):
+        """
+        Creates database spreading sensor data across multiple shard databases.
+        Documents of routed collections are placed on shards by consistent hashing of their "id".
+        Every other collection is stored in the directory database.
+
+        :param shards Dictionary mapping shard names to their databases
+        :param directory Database storing the api key directory and not routed collections
+        :param routed_collections Names of collections spread across the shards
+        :param keyed_collection Name of the routed collection, which api keys are registered in the directory
+        :param workers Number of threads shared by all requests for fanning out queries
+        """
+
+        # Refusing to create database without any shard to store data on
+        if not shards:
+            raise ValueError("Sharded database requires at least one shard")
+
+        self.shards = shards
+        self.ring = HashRing(list(shards))
+        self.routed_collections = set(routed_collections)
+        self.keyed_collection = keyed_collection
+        self.unrouted = directory
+
+        # Thread pool used for fanning out queries to all shards in parallel, shared by all request threads
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        # Getting directory collection and indexing it by key and id
+        self.directory = directory[DIRECTORY_COLLECTION]
+        self.directory.create_index(["key"])
+        self.directory.create_index(["id"])
+
+        self.collections = {name: ShardedCollection(self, name) for name in self.routed_collections}
+
+
+    def __getitem__(self, name:str) -> Collection:
+
+        # Returning not routed collections from directory database
+        if name not in self.routed_collections:
+            return self.unrouted[name]
+
+        return self.collections[name]
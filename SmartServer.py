@@ -1,6 +1,6 @@
 import json
 
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 from os import getenv
 from datetime import datetime
 import traceback
@@ -14,6 +14,13 @@ from InputManager import InputManager
 from OutputManager import OutputManager
 from SensorManager import SensorManager
 from SSLContextGenerator import generateSSLContext
+from Profiler import Profiler, PROFILE
+from Alerts import AlertManager
+from Capture import TrafficRecorder, CAPTURE
+from Exporter import export, EXPORT_TYPES, EXPORT_FORMATS
+from Compression import ResponseCompressor, COMPRESSION
+from RateLimiter import TokenBucketLimiter, RATE_LIMIT, RATE_DEFAULT, RATE_BURST, RATE_BY_TYPE, RATE_IP, RATE_IP_BURST, \
+    RATE_MAX_UNKNOWN_KEYS
 
 # Debug mode settings
 DEBUG_MODE = getenv("SMART_SCHOOL_DEBUG", False)
@@ -28,11 +35,17 @@ DB_CON = getenv("SMART_SCHOOL_DB_CON", "mongodb://localhost:27017/")
 # Initialize flask app
 app = Flask(__name__, )
 
-# Initialize db client as none
+# Initialize db client, alert manager, recorder, profiler, rate limiters and compressor as none
 db_client = None
+alert_manager = None
+recorder = None
+profiler = None
+key_limiter = None
+ip_limiter = None
+compressor = None
 
 def init():
-    global db_client
+    global db_client, alert_manager, recorder, profiler, key_limiter, ip_limiter, compressor
 
     # Generating ssl context for webserver
     context = generateSSLContext()
@@ -40,10 +53,79 @@ def init():
     # Initialize MongoDB Client
     db_client = DBClient(DB_CON)
 
+    # Initialize profiler and time database calls, if profiling is enabled
+    if PROFILE:
+        profiler = Profiler()
+        profiler.instrument(db_client)
+
+    # Initialize traffic recorder, if capture mode is enabled
+    if CAPTURE:
+        recorder = TrafficRecorder()
+
+    # Initialize alert manager evaluating alert rules on incoming values
+    alert_manager = AlertManager(db_client)
+
+    # Initialize per api key and per ip rate limiters, if rate limiting is enabled
+    if RATE_LIMIT:
+        key_limiter = TokenBucketLimiter(RATE_DEFAULT, RATE_BURST, max_unknown_keys=RATE_MAX_UNKNOWN_KEYS)
+        ip_limiter = TokenBucketLimiter(RATE_IP, RATE_IP_BURST)
+
+    # Initialize response compressor, if compression is enabled
+    if COMPRESSION:
+        compressor = ResponseCompressor()
+
     # Starting webserver on port 99
     app.run(host=HOST, port=PORT, ssl_context=context, debug=DEBUG_MODE)
 
 
+@app.before_request
+def beginProfiling():
+    """
+    Starts profiling the current request, if profiling is enabled
+    """
+    if profiler is not None:
+        profiler.begin()
+
+
+@app.after_request
+def endProfiling(response):
+    """
+    Finishes profiling the current request, if profiling is enabled
+    """
+    if profiler is not None:
+        profiler.end(request.path, response.status_code)
+
+    return response
+
+
+@app.after_request
+def captureRequest(response):
+    """
+    Captures the current request and it's response, if capture mode is enabled.
+    Streamed, compressed and binary responses are captured without their body.
+    """
+    if recorder is not None:
+
+        # Getting response body, if it can be read without consuming a stream
+        body = None
+        if(not response.is_streamed
+                and "Content-Encoding" not in response.headers
+                and response.mimetype != "application/octet-stream"):
+            body = response.get_data()
+
+        recorder.capture(request.path, request.method, request.get_json(silent=True), response.status_code, body)
+
+    return response
+
+
+def annotateSensor(id):
+    """
+    Sets id of the sensor the current request refers to for profiling
+    """
+    if profiler is not None:
+        profiler.annotate(id)
+
+
 def fetchJSON():
     """
     :return JSON data from current request
@@ -61,14 +143,26 @@ def reciveInput():
 
         # Fetching JSON data from request
         data = fetchJSON()
+        api = data.get("api")
+
+        # Returning "too many requests" status before accessing the database, if a rate limit is exceeded
+        if key_limiter is not None:
+            if not ip_limiter.allow(request.remote_addr) or not key_limiter.allow(api):
+                return '{"status": "too many requests"}', 429
 
         # Initializing input manager with given api key
-        input_manager = InputManager(data.get("api"), db_client)
+        input_manager = InputManager(api, db_client, alert_manager)
 
         # Returning "access denied" status, if api key is invalid
         if not input_manager.api_valid:
             return '{"status": "access denied"}', 403
 
+        annotateSensor(input_manager.id)
+
+        # Applying rate of the sensor type to the api key and counting rejections for the sensor id
+        if key_limiter is not None:
+            key_limiter.identify(api, input_manager.id, RATE_BY_TYPE.get(input_manager.type))
+
         # Registering heartbeat for the sensor
         input_manager.heartbeat()
 
@@ -106,6 +200,7 @@ def sendOutput():
 
         # Initializing output manager with given sensor id and master key if provided
         output_manager = OutputManager(data["id"], db_client, auth=data.get("key"))
+        annotateSensor(data["id"])
 
         # Returning "not found" status if sensor id is invalid
         if not output_manager.id_valid:
@@ -117,7 +212,20 @@ def sendOutput():
         # Dumping dictionary to json string
         result = json.dumps(result)
 
-        return result, 200
+        # Returning uncompressed result, if compression is disabled
+        if compressor is None:
+            return result, 200
+
+        # Compressing result with encoding accepted by the client
+        cache_key = (output_manager.id, output_manager.master)
+        result, encoding = compressor.compress(request.path, cache_key, result,
+                                               request.headers.get("Accept-Encoding", ""))
+
+        headers = {"Content-Type": "text/html; charset=utf-8", "Vary": "Accept-Encoding"}
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        return result, 200, headers
 
     except:
 
@@ -138,6 +246,9 @@ def manageSensor():
     "create": Creates new sensor, requires field "type" to be set. Response contains "id" and "api", if successful.
     "delete": Deletes sensor of given id.
     "reset": Resets sensor of given id. It's the only action that can be performed using the api key.
+    "bulk_create": Creates "count" new sensors, requires field "type" to be set. Response contains "sensors".
+    "bulk_delete": Deletes sensors of given list "ids" including their data. Response contains "sensors".
+    "bulk_reset": Resets sensors of given list "ids". Response contains "sensors".
     """
     try:
 
@@ -163,6 +274,19 @@ def manageSensor():
         elif action == "reset":
             response = sensor_manager.reset(data["id"], api=data.get("api"))
 
+        elif action == "bulk_create":
+            response = sensor_manager.createMany(data["type"], data["count"])
+
+        elif action == "bulk_delete":
+            response = sensor_manager.destroyMany(data["ids"])
+
+        elif action == "bulk_reset":
+            response = sensor_manager.resetMany(data["ids"])
+
+        # Forgetting rolling alert states of deleted sensors
+        if action in ("delete", "bulk_delete") and response["status"] == "ok":
+            alert_manager.forgetSensors(data["ids"] if action == "bulk_delete" else [data["id"]])
+
         # Initializing response code as 400 (Bad Request)
         response_code = 400
 
@@ -193,6 +317,232 @@ def manageSensor():
         return '{"status": "bad request"}', 400
 
 
+@app.route("/profile", methods=["POST"])
+def sendProfile():
+    """
+    Handle requests from masters to download aggregated profiles of sampled requests.
+    Requires json to be send containing "key" as a valid master key.
+    Optionally "route" can be set to only get profiles of the given route
+    and "reset" can be set to true to clear profiles after downloading them.
+    Response is a file in the format written by pstats.
+    """
+    try:
+
+        # Fetching JSON data from request
+        data = fetchJSON()
+
+        # Returning "access denied" status, if master key is invalid
+        if not SensorManager(db_client, data.get("key")).master:
+            return '{"status": "access denied", "hint": "Master key is required!"}', 403
+
+        # Returning "not found" status, if profiling is disabled
+        if profiler is None:
+            return '{"status": "not found", "hint": "Profiling is disabled!"}', 404
+
+        # Dumping aggregated profiles
+        stats = profiler.dumpStats(data.get("route"), reset=data.get("reset", False))
+
+        # Returning "not found" status, if no profile has been recorded
+        if stats is None:
+            return '{"status": "not found", "hint": "No profiles recorded!"}', 404
+
+        return stats, 200, {"Content-Type": "application/octet-stream",
+                            "Content-Disposition": "attachment; filename=smart_school.prof"}
+
+    except:
+
+        # Printing debug information, if debug mode is enabled
+        if DEBUG_MODE:
+            printErrorReport()
+
+        # Returning "bad request" status, if any error occurs
+        return '{"status": "bad request"}', 400
+
+
+@app.route("/limits", methods=["POST"])
+def sendLimits():
+    """
+    Handle requests from masters to get the number of requests rejected by rate limiting.
+    Requires json to be send containing "key" as a valid master key.
+    Response contains "sensors" mapping sensor ids to their number of rejected requests,
+    requests with unknown api keys are counted as "unknown".
+    Response contains "ip" as the number of requests rejected by the per ip limit.
+    """
+    try:
+
+        # Fetching JSON data from request
+        data = fetchJSON()
+
+        # Returning "access denied" status, if master key is invalid
+        if not SensorManager(db_client, data.get("key")).master:
+            return '{"status": "access denied", "hint": "Master key is required!"}', 403
+
+        # Returning "not found" status, if rate limiting is disabled
+        if key_limiter is None:
+            return '{"status": "not found", "hint": "Rate limiting is disabled!"}', 404
+
+        # Creating response with rejection counters
+        response = {
+            "status": "ok",
+            "sensors": key_limiter.getRejected(),
+            "ip": sum(ip_limiter.getRejected().values())
+        }
+
+        return json.dumps(response), 200
+
+    except:
+
+        # Printing debug information, if debug mode is enabled
+        if DEBUG_MODE:
+            printErrorReport()
+
+        # Returning "bad request" status, if any error occurs
+        return '{"status": "bad request"}', 400
+
+
+@app.route("/compression", methods=["POST"])
+def sendCompressionRatios():
+    """
+    Handle requests from masters to get compression ratios of responses.
+    Requires json to be send containing "key" as a valid master key.
+    Response contains "routes" mapping routes to their "original" and "compressed" number of bytes sent
+    and the resulting "ratio".
+    """
+    try:
+
+        # Fetching JSON data from request
+        data = fetchJSON()
+
+        # Returning "access denied" status, if master key is invalid
+        if not SensorManager(db_client, data.get("key")).master:
+            return '{"status": "access denied", "hint": "Master key is required!"}', 403
+
+        # Returning "not found" status, if compression is disabled
+        if compressor is None:
+            return '{"status": "not found", "hint": "Compression is disabled!"}', 404
+
+        return json.dumps({"status": "ok", "routes": compressor.getRatios()}), 200
+
+    except:
+
+        # Printing debug information, if debug mode is enabled
+        if DEBUG_MODE:
+            printErrorReport()
+
+        # Returning "bad request" status, if any error occurs
+        return '{"status": "bad request"}', 400
+
+
+@app.route("/export", methods=["POST"])
+def sendExport():
+    """
+    Handle requests from masters to export data of all sensors as a stream.
+    Requires json to be send containing "key" as a valid master key.
+    Optionally "format" can be set to "ndjson" (default) or "csv",
+    "types" can be set to a list of sensor types to export
+    and "start" and "end" can be set to time seconds limiting the exported co2 levels.
+    """
+    try:
+
+        # Fetching JSON data from request
+        data = fetchJSON()
+
+        # Returning "access denied" status, if master key is invalid
+        if not SensorManager(db_client, data.get("key")).master:
+            return '{"status": "access denied", "hint": "Master key is required!"}', 403
+
+        # Getting export options from request
+        format = data.get("format", "ndjson")
+        types = data.get("types", list(EXPORT_TYPES))
+        start = data.get("start")
+        end = data.get("end")
+
+        # Returning "bad request" status, if format or types are invalid
+        if(format not in EXPORT_FORMATS
+                or not isinstance(types, list)
+                or not all(type in EXPORT_TYPES for type in types)):
+            return '{"status": "bad request", "hint": "Invalid format or type!"}', 400
+
+        # Returning "bad request" status, if time range is invalid,
+        # since errors can't be reported anymore once streaming started
+        for limit in (start, end):
+            if limit is not None and (not isinstance(limit, (int, float)) or isinstance(limit, bool)):
+                return '{"status": "bad request", "hint": "Start and end have to be time seconds!"}', 400
+
+        # Streaming exported chunks while they are read from the database
+        chunks = export(db_client.getDataBase(), format, types, start, end)
+        mimetype = "text/csv" if format == "csv" else "application/x-ndjson"
+
+        return Response(stream_with_context(chunks), mimetype=mimetype)
+
+    except:
+
+        # Printing debug information, if debug mode is enabled
+        if DEBUG_MODE:
+            printErrorReport()
+
+        # Returning "bad request" status, if any error occurs
+        return '{"status": "bad request"}', 400
+
+
+@app.route("/alerts", methods=["POST"])
+def manageAlerts():
+    """
+    Handle requests from masters to manage alert rules and get alerts.
+    Requires json to be send containing "key" as a valid master key.
+    Requires json to be send containing "action" as a string containing one of the following actions:
+    "list": Lists alerts of sensor with given "id", or all active alerts if no id is given. Response contains "alerts".
+    "add_rule": Adds rule for sensors of given "type", requires field "limit" to be set.
+        Optionally "sensor" can be set to a sensor id to only apply the rule to that sensor,
+        "window" can be set to compare the average of the last seconds to the limit
+        and "duration" can be set to the seconds the limit has to be exceeded for. Response contains "rule".
+    "delete_rule": Deletes rule of given "rule" id.
+    "rules": Lists all rules. Response contains "rules".
+    """
+    try:
+
+        # Fetching JSON data from request
+        data = fetchJSON()
+
+        # Returning "access denied" status, if master key is invalid
+        if not SensorManager(db_client, data.get("key")).master:
+            return '{"status": "access denied", "hint": "Master key is required!"}', 403
+
+        # Getting action from request
+        action = data["action"]
+
+        # Initializing response with "bad request" status
+        response = {"status": "bad request", "hint": "Invalid action!"}
+
+        # Performing action corresponding to action in request
+        if action == "list":
+            response = alert_manager.listAlerts(data.get("id"))
+
+        elif action == "add_rule":
+            response = alert_manager.addRule(data["type"], data["limit"], sensor=data.get("sensor"),
+                                             window=data.get("window", 0), duration=data.get("duration", 0))
+
+        elif action == "delete_rule":
+            response = alert_manager.deleteRule(data["rule"])
+
+        elif action == "rules":
+            response = alert_manager.listRules()
+
+        # Setting response code according to status
+        response_code = {"ok": 200, "not found": 404}.get(response["status"], 400)
+
+        return json.dumps(response), response_code
+
+    except:
+
+        # Printing debug information, if debug mode is enabled
+        if DEBUG_MODE:
+            printErrorReport()
+
+        # Returning "bad request" status, if any error occurs
+        return '{"status": "bad request"}', 400
+
+
 def printErrorReport():
     # Getting current time and data
     now = datetime.now()
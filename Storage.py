@@ -0,0 +1,117 @@
+from collections import Counter
+
+
+class DuplicateKeyError(Exception):
+    """
+    Raised by storage backends, if an insert violates a unique index
+    or a unique index can't be created because of duplicates
+    """
+
+
+def checkQuery(query:dict):
+    """
+    Raises ValueError, if query contains operators other than "$in"
+    """
+
+    for field, value in query.items():
+        if isinstance(value, dict) and list(value) != ["$in"]:
+            raise ValueError(f"Unsupported query operator for field {field}: {', '.join(value)}")
+
+
+def findDuplicates(collection, field:str):
+    """
+    Iterates threw all documents of the collection to find values of given field shared by multiple documents
+
+    :return Dictionary mapping duplicate values to the number of documents containing them
+    """
+
+    counts = Counter(document.get(field) for document in collection.find({}, {field: True}))
+    return {value: count for value, count in counts.items() if count > 1}
+
+
+class Collection:
+    """
+    Storage backend interface of a single collection of documents.
+    Documents are dictionaries. Queries are dictionaries mapping field names either to a value
+    the field has to be equal to or to {"$in": [...]} matching any of the listed values.
+    Any other operator is rejected with a ValueError.
+    Updates are dictionaries of the form {"$set": {...}}.
+    The interface follows pymongo's collection interface.
+    """
+
+    def find_one(self, query:dict):
+        """
+        :return First document matching query or None, if no document matches
+        """
+        raise NotImplementedError
+
+    def find(self, query:dict, projection:dict=None):
+        """
+        :return Iterable of all documents matching query,
+            limited to fields set to True or without fields set to False in projection if provided
+        """
+        raise NotImplementedError
+
+    def count_documents(self, query:dict):
+        """
+        :return Number of documents matching query
+        """
+        raise NotImplementedError
+
+    def insert_one(self, document:dict):
+        """
+        Inserts single document into the collection.
+        Raises DuplicateKeyError, if the document violates a unique index.
+        """
+        raise NotImplementedError
+
+    def insert_many(self, documents:list):
+        """
+        Inserts list of documents into the collection at once.
+        Raises DuplicateKeyError, if one of the documents violates a unique index,
+        documents before the violating one may have been inserted.
+        """
+        raise NotImplementedError
+
+    def update_one(self, query:dict, update:dict):
+        """
+        Updates first document matching query with fields given in "$set" of update
+
+        :return Number of matched documents
+        """
+        raise NotImplementedError
+
+    def delete_one(self, query:dict):
+        """
+        Deletes first document matching query
+        """
+        raise NotImplementedError
+
+    def delete_many(self, query:dict):
+        """
+        Deletes all documents matching query
+        """
+        raise NotImplementedError
+
+    def create_index(self, fields:list, unique:bool=False):
+        """
+        Creates index over given fields, if it doesn't exist yet.
+        Raises DuplicateKeyError, if a unique index is requested and stored documents contain duplicates.
+
+        :param fields List of field names
+        :param unique Rejects documents with the same values in all fields, if True
+        """
+        raise NotImplementedError
+
+
+class Database:
+    """
+    Storage backend interface of a database containing named collections.
+    Collections are accessed by name using database[name].
+    """
+
+    def __getitem__(self, name:str) -> Collection:
+        """
+        :return Collection of given name
+        """
+        raise NotImplementedError
@@ -0,0 +1,50 @@
+import types
+import uuid
+from os import getenv
+
+import pytest
+
+from Sharding import ShardedDatabase
+from SQLite import SQLiteDatabase
+
+# MongoDB connection string used for tests of the mongodb backend
+TEST_DB_CON = getenv("SMART_SCHOOL_TEST_DB_CON", "mongodb://localhost:27017/")
+
+
+@pytest.fixture(params=["sqlite", "sharded", "mongodb"])
+def database(request, tmp_path):
+    """
+    Yields empty database of every storage backend, the sharded backend is tested with sqlite shards.
+    MongoDB is skipped, if pymongo isn't installed or no server is reachable.
+    """
+
+    if request.param == "sqlite":
+        yield SQLiteDatabase(str(tmp_path / "test.db"))
+        return
+
+    if request.param == "sharded":
+        shards = {name: SQLiteDatabase(str(tmp_path / f"{name}.db")) for name in ("a", "b", "c")}
+        yield ShardedDatabase(shards, SQLiteDatabase(str(tmp_path / "directory.db")),
+                              ["Clients", "PersonCounters", "CO2Sensors"], "Clients")
+        return
+
+    pymongo = pytest.importorskip("pymongo")
+    from Mongo import MongoDatabase
+
+    client = pymongo.MongoClient(TEST_DB_CON, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip("No MongoDB server reachable")
+
+    name = "SmartSchoolTest_" + uuid.uuid4().hex[:8]
+    yield MongoDatabase(client[name])
+    client.drop_database(name)
+
+
+@pytest.fixture
+def db_client(database):
+    """
+    :return Object providing the database of every storage backend like a DBClient
+    """
+    return types.SimpleNamespace(getDataBase=lambda: database)
@@ -0,0 +1,162 @@
+import pytest
+
+# Alerts imports the mongodb backend, which requires pymongo
+pytest.importorskip("pymongo")
+
+import Alerts
+from Alerts import AlertManager, RuleState, WINDOW_BUCKETS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    :return List containing the current time seconds used by the alert manager, which can be changed by tests
+    """
+
+    clock = [1000.0]
+    monkeypatch.setattr(Alerts, "time", lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def manager(db_client, clock):
+    return AlertManager(db_client)
+
+
+def evaluate(manager, clock, timestamp:float, value:float, id:str="S1"):
+    """
+    Evaluates value of a co2 sensor at given time
+    """
+
+    clock[0] = timestamp
+    manager.evaluate(id, "co2", value)
+
+
+def activeAlerts(manager, id:str="S1"):
+    """
+    :return List of active alerts of the sensor
+    """
+    return [alert for alert in manager.listAlerts(id)["alerts"] if alert["active"]]
+
+
+def test_fire_and_resolve(manager, clock):
+    rule = manager.addRule("co2", 1000)["rule"]
+
+    evaluate(manager, clock, 1000, 900)
+    assert activeAlerts(manager) == []
+
+    evaluate(manager, clock, 1001, 1200)
+    alerts = activeAlerts(manager)
+    assert len(alerts) == 1
+    assert alerts[0]["rule"] == rule
+    assert alerts[0]["value"] == 1200
+
+    # Keeping single alert, while the limit stays exceeded
+    evaluate(manager, clock, 1002, 1300)
+    assert len(manager.listAlerts("S1")["alerts"]) == 1
+
+    evaluate(manager, clock, 1003, 800)
+    assert activeAlerts(manager) == []
+    assert manager.listAlerts("S1")["alerts"][0]["resolved"] == 1003
+
+
+def test_duration(manager, clock):
+    manager.addRule("co2", 1000, duration=60)
+
+    evaluate(manager, clock, 1000, 1200)
+    evaluate(manager, clock, 1059, 1200)
+    assert activeAlerts(manager) == []
+
+    evaluate(manager, clock, 1060, 1200)
+    assert len(activeAlerts(manager)) == 1
+
+    evaluate(manager, clock, 1061, 800)
+    assert activeAlerts(manager) == []
+
+    # Restarting duration, once the limit is exceeded again
+    evaluate(manager, clock, 1062, 1200)
+    evaluate(manager, clock, 1100, 1200)
+    assert activeAlerts(manager) == []
+
+
+def test_window_average(manager, clock):
+    manager.addRule("co2", 1000, window=60)
+
+    evaluate(manager, clock, 1000, 500)
+    evaluate(manager, clock, 1001, 1400)
+    assert activeAlerts(manager) == []
+
+    evaluate(manager, clock, 1002, 1600)
+    assert len(activeAlerts(manager)) == 1
+
+    # Dropping samples, that left the window
+    evaluate(manager, clock, 1100, 900)
+    assert activeAlerts(manager) == []
+
+
+def test_rolling_state_constant_size():
+    state = RuleState(False)
+    for second in range(10000):
+        average = state.add(second % 10, second / 10, 60)
+
+    assert len(state.buckets) <= WINDOW_BUCKETS
+    assert average == pytest.approx(4.5, abs=0.1)
+
+
+def test_sensor_rule(manager, clock):
+    manager.addRule("co2", 1000, sensor="S1")
+
+    evaluate(manager, clock, 1000, 1200, id="S2")
+    assert activeAlerts(manager, "S2") == []
+
+    evaluate(manager, clock, 1000, 1200, id="S1")
+    assert len(activeAlerts(manager, "S1")) == 1
+
+
+def test_state_survives_restart(db_client, manager, clock):
+    manager.addRule("co2", 1000)
+    evaluate(manager, clock, 1000, 1200)
+
+    # Continuing with active alert instead of raising a second one
+    restarted = AlertManager(db_client)
+    evaluate(restarted, clock, 1001, 1300)
+    assert len(restarted.listAlerts("S1")["alerts"]) == 1
+
+    evaluate(restarted, clock, 1002, 800)
+    assert activeAlerts(restarted) == []
+
+
+def test_delete_rule_resolves_alerts(manager, clock):
+    rule = manager.addRule("co2", 1000)["rule"]
+    evaluate(manager, clock, 1000, 1200)
+
+    assert manager.deleteRule(rule)["status"] == "ok"
+    assert activeAlerts(manager) == []
+    assert manager.states == {}
+    assert manager.deleteRule(rule)["status"] == "not found"
+
+
+def test_forget_and_prune_states(manager, clock):
+    manager.addRule("co2", 1000)
+    evaluate(manager, clock, 1000, 900, id="S1")
+    evaluate(manager, clock, 1000, 900, id="S2")
+
+    manager.forgetSensors(["S1"])
+    assert [key[1] for key in manager.states] == ["S2"]
+
+    # Forgetting states of sensors idle for longer than the idle time
+    clock[0] = 1000 + Alerts.STATE_IDLE_TIME + 1
+    manager.pruneStates()
+    assert manager.states == {}
+
+
+@pytest.mark.parametrize("parameters", [
+    {"type": "temperature", "limit": 1000},
+    {"type": "co2", "limit": True},
+    {"type": "co2", "limit": "1000"},
+    {"type": "co2", "limit": 1000, "window": -1},
+    {"type": "co2", "limit": 1000, "duration": -1},
+    {"type": "co2", "limit": 1000, "sensor": 5}
+])
+def test_invalid_rules(manager, parameters):
+    assert manager.addRule(**parameters)["status"] == "bad request"
@@ -0,0 +1,93 @@
+import gzip
+import zlib
+
+import pytest
+
+from Compression import ENCODINGS, ResponseCompressor, negotiateEncoding
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, deflate;q=0.8", "deflate"),
+    ("deflate, gzip", "gzip"),
+    ("GZIP ; q=1.0", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=invalid", None),
+    ("identity", None),
+    ("", None),
+    ("*", ENCODINGS[0]),
+    ("*;q=0.5, br;q=0, gzip;q=0", "deflate"),
+])
+def test_negotiate_encoding(accept_encoding, encoding):
+    assert negotiateEncoding(accept_encoding) == encoding
+
+
+def test_compress():
+    compressor = ResponseCompressor(threshold=100)
+    body = '{"levels": [' + ", ".join(str(i % 10) for i in range(1000)) + "]}"
+
+    compressed, encoding = compressor.compress("/output", "A", body, "gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(compressed).decode() == body
+
+    compressed, encoding = compressor.compress("/output", "A", body, "deflate")
+    assert encoding == "deflate"
+    assert zlib.decompress(compressed).decode() == body
+
+
+def test_small_and_unaccepted_bodies_uncompressed():
+    compressor = ResponseCompressor(threshold=100)
+
+    assert compressor.compress("/output", "A", "small", "gzip") == (b"small", None)
+    assert compressor.compress("/output", "B", "x" * 200, "identity") == (b"x" * 200, None)
+    assert not compressor.cache
+
+
+def test_ratios_include_uncompressed_responses():
+    compressor = ResponseCompressor(threshold=100)
+    compressor.compress("/output", "A", "x" * 10, "gzip")
+    compressed, _ = compressor.compress("/output", "B", "x" * 1000, "gzip")
+
+    ratios = compressor.getRatios()["/output"]
+    assert ratios["original"] == 1010
+    assert ratios["compressed"] == 10 + len(compressed)
+
+
+def test_cached_compression():
+    compressor = ResponseCompressor(threshold=0)
+    first, _ = compressor.compress("/output", "A", "x" * 1000, "gzip")
+    second, _ = compressor.compress("/output", "A", "x" * 1000, "gzip")
+    assert second is first
+
+    # Replacing cache entry, if the body changed
+    third, _ = compressor.compress("/output", "A", "y" * 1000, "gzip")
+    assert gzip.decompress(third) == b"y" * 1000
+    assert compressor.cached_bytes == 1000 + len(third)
+
+
+def test_cache_bounded_by_bytes():
+    compressor = ResponseCompressor(threshold=0, cache_bytes=2500)
+
+    def entrySize(body):
+        return len(body) + len(gzip.compress(body.encode(), compresslevel=6))
+
+    bodies = {key: key * 1000 for key in "ABC"}
+    compressor.compress("/output", "A", bodies["A"], "gzip")
+    compressor.compress("/output", "B", bodies["B"], "gzip")
+
+    # Using "A", so "B" is the least recently used entry evicted by "C"
+    compressor.compress("/output", "A", bodies["A"], "gzip")
+    compressor.compress("/output", "C", bodies["C"], "gzip")
+
+    assert list(compressor.cache) == ["A", "C"]
+    assert compressor.cached_bytes == entrySize(bodies["A"]) + entrySize(bodies["C"])
+    assert compressor.cached_bytes <= compressor.cache_bytes
+
+
+def test_body_larger_than_cache():
+    compressor = ResponseCompressor(threshold=0, cache_bytes=100)
+    compressed, encoding = compressor.compress("/output", "A", "x" * 1000, "gzip")
+
+    assert gzip.decompress(compressed) == b"x" * 1000
+    assert not compressor.cache
+    assert compressor.cached_bytes == 0
@@ -0,0 +1,84 @@
+from RateLimiter import TokenBucketLimiter
+
+
+def createLimiter(burst=2, max_unknown_keys=3):
+    """
+    :return Limiter, which buckets aren't refilled during the test
+    """
+    return TokenBucketLimiter(rate=0, burst=burst, max_keys=10, idle_time=600, max_unknown_keys=max_unknown_keys)
+
+
+def test_burst():
+    limiter = createLimiter(burst=2)
+    assert [limiter.allow("key") for _ in range(3)] == [True, True, False]
+    assert limiter.getRejected() == {"unknown": 1}
+
+
+def test_unknown_keys_dont_evict_known_keys():
+    limiter = createLimiter()
+    limiter.allow("good")
+    limiter.identify("good", "co2")
+
+    # Flooding limiter with invalid keys
+    for i in range(100):
+        limiter.allow(f"bad{i}")
+
+    assert "good" in limiter.buckets
+    assert len(limiter.unknown) == 3
+
+    # Keeping the token taken before the flood
+    assert limiter.allow("good") is True
+    assert limiter.allow("good") is False
+
+
+def test_identify_moves_bucket():
+    limiter = createLimiter()
+    limiter.allow("key")
+    limiter.identify("key", "person", rate=5)
+
+    assert "key" not in limiter.unknown
+    assert limiter.buckets["key"][0] == 1
+    assert limiter.buckets["key"][2] == 5
+
+
+def test_identify_after_eviction_keeps_taken_token():
+    limiter = createLimiter()
+    limiter.allow("key")
+
+    # Evicting bucket of the unconfirmed key, before it's identified
+    for i in range(3):
+        limiter.allow(f"other{i}")
+    assert "key" not in limiter.unknown
+
+    limiter.identify("key", "co2")
+    assert limiter.allow("key") is True
+    assert limiter.allow("key") is False
+
+
+def test_rejected_by_label():
+    limiter = createLimiter(burst=1)
+    limiter.allow("key")
+    limiter.identify("key", "co2")
+    limiter.allow("key")
+    limiter.allow("other")
+    limiter.allow("other")
+
+    assert limiter.getRejected() == {"co2": 1, "unknown": 1}
+
+
+def test_without_unknown_cache():
+    limiter = createLimiter(max_unknown_keys=None)
+    for i in range(20):
+        limiter.allow(f"key{i}")
+
+    assert len(limiter.buckets) == 10
+    assert not limiter.unknown
+
+
+def test_idle_buckets_evicted():
+    limiter = TokenBucketLimiter(rate=0, burst=1, max_keys=10, idle_time=0, max_unknown_keys=3)
+    limiter.allow("key")
+    limiter.identify("key", "co2")
+
+    # Evicting idle bucket, so the key starts with a full bucket again
+    assert limiter.allow("key") is True
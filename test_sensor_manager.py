@@ -0,0 +1,98 @@
+import pytest
+
+# SensorManager imports the mongodb backend, which requires pymongo
+pytest.importorskip("pymongo")
+
+from SensorManager import SensorManager, CLIENTS_COLLECTION, MASTERS_COLLECTION
+
+MASTER_KEY = "master"
+
+
+@pytest.fixture
+def manager(db_client):
+    """
+    :return Sensor manager with master privileges and a unique index on sensor ids,
+        as created by DBClient, and one stored sensor of id "TAKEN"
+    """
+
+    database = db_client.getDataBase()
+    database[MASTERS_COLLECTION].insert_one({"key": MASTER_KEY})
+    database[CLIENTS_COLLECTION].create_index(["id"], unique=True)
+    database[CLIENTS_COLLECTION].insert_one({"id": "TAKEN", "key": "taken", "type": "co2"})
+    return SensorManager(db_client, MASTER_KEY)
+
+
+def takeIdsFirst(manager, monkeypatch, ids:list):
+    """
+    Lets the next call of generateIds return given ids, as if they were free when generated
+    but have been taken by another request before they are inserted
+    """
+
+    generate = manager.generateIds
+    calls = []
+
+    def generateIds(count):
+        calls.append(count)
+        return ids if len(calls) == 1 else generate(count)
+
+    monkeypatch.setattr(manager, "generateIds", generateIds)
+
+
+def checkSensors(manager, sensors:list):
+    """
+    Asserts that every created sensor is stored with it's returned id and api key
+    """
+
+    clients_coll = manager.database[CLIENTS_COLLECTION]
+    for sensor in sensors:
+        assert clients_coll.find_one({"key": sensor["api"]})["id"] == sensor["id"]
+
+
+def test_create(manager):
+    response = manager.create("co2")
+    assert response["status"] == "ok"
+    checkSensors(manager, [response])
+
+
+def test_create_retries_taken_id(manager, monkeypatch):
+    takeIdsFirst(manager, monkeypatch, ["TAKEN"])
+
+    response = manager.create("co2")
+    assert response["status"] == "ok"
+    assert response["id"] != "TAKEN"
+    checkSensors(manager, [response])
+
+
+def test_create_many(manager):
+    response = manager.createMany("person", 50)
+    assert len({sensor["id"] for sensor in response["sensors"]}) == 50
+    checkSensors(manager, response["sensors"])
+
+
+@pytest.mark.parametrize("taken", [0, 1, 3])
+def test_create_many_retries_taken_ids(manager, monkeypatch, taken):
+
+    # Placing taken id at the start, in the middle or at the end of the batch
+    ids = ["AAAAA", "BBBBB", "CCCCC"]
+    ids.insert(taken, "TAKEN")
+    takeIdsFirst(manager, monkeypatch, ids)
+
+    response = manager.createMany("co2", 4)
+    sensors = response["sensors"]
+
+    assert response["status"] == "ok"
+    assert len({sensor["id"] for sensor in sensors}) == 4
+    assert "TAKEN" not in {sensor["id"] for sensor in sensors}
+    checkSensors(manager, sensors)
+
+    # Storing every sensor exactly once next to the already taken one
+    assert manager.database[CLIENTS_COLLECTION].count_documents({}) == 5
+
+
+def test_create_many_limits(manager):
+    assert manager.createMany("co2", 0)["status"] == "bad request"
+    assert manager.createMany("co2", True)["status"] == "bad request"
+
+
+def test_access_denied(db_client):
+    assert SensorManager(db_client, "invalid").createMany("co2", 1)["status"] == "access denied"
@@ -0,0 +1,171 @@
+import threading
+
+import pytest
+
+from Storage import DuplicateKeyError, findDuplicates
+
+
+def strip(document):
+    """
+    :return Document without mongodb's "_id" field, so documents of both backends can be compared
+    """
+    if document is None:
+        return None
+    return {field: value for field, value in document.items() if field != "_id"}
+
+
+def sortedDocuments(documents):
+    """
+    :return List of stripped documents sorted by id
+    """
+    return sorted((strip(document) for document in documents), key=lambda document: document["id"])
+
+
+@pytest.fixture
+def collection(database):
+    """
+    :return Collection filled with three sensor documents
+    """
+
+    collection = database["Clients"]
+    collection.insert_many([
+        {"id": "A", "key": "ka", "type": "co2", "heartbeat": 1},
+        {"id": "B", "key": "kb", "type": "person", "heartbeat": 2},
+        {"id": "C", "key": "kc", "type": "co2", "heartbeat": 3}
+    ])
+    return collection
+
+
+def test_find_one(collection):
+    assert strip(collection.find_one({"id": "B"})) == {"id": "B", "key": "kb", "type": "person", "heartbeat": 2}
+    assert strip(collection.find_one({"key": "kc"}))["id"] == "C"
+    assert collection.find_one({"id": "Z"}) is None
+
+
+def test_find_one_multiple_fields(collection):
+    assert strip(collection.find_one({"type": "co2", "heartbeat": 3}))["id"] == "C"
+    assert collection.find_one({"type": "person", "heartbeat": 3}) is None
+
+
+def test_find(collection):
+    assert [document["id"] for document in sortedDocuments(collection.find({"type": "co2"}))] == ["A", "C"]
+    assert len(list(collection.find({}))) == 3
+
+
+def test_find_many_documents(database):
+    collection = database["PersonCounters"]
+    collection.insert_many([{"id": f"S{i}", "count": i % 2} for i in range(500)])
+    assert len(list(collection.find({}))) == 500
+    assert len(list(collection.find({"count": 1}, {"id": True}))) == 250
+
+
+def test_find_inclusion_projection(collection):
+    documents = sortedDocuments(collection.find({"type": "co2"}, {"id": True, "key": True}))
+    assert documents == [{"id": "A", "key": "ka"}, {"id": "C", "key": "kc"}]
+
+
+def test_find_exclusion_projection(collection):
+    documents = sortedDocuments(collection.find({"id": "A"}, {"_id": False, "key": False}))
+    assert documents == [{"id": "A", "type": "co2", "heartbeat": 1}]
+
+
+def test_count_documents(collection):
+    assert collection.count_documents({}) == 3
+    assert collection.count_documents({"type": "co2"}) == 2
+    assert collection.count_documents({"id": "Z"}) == 0
+
+
+def test_in(collection):
+    documents = sortedDocuments(collection.find({"id": {"$in": ["A", "C", "Z"]}}))
+    assert [document["id"] for document in documents] == ["A", "C"]
+    assert collection.count_documents({"type": {"$in": ["person"]}}) == 1
+    assert collection.count_documents({"id": {"$in": []}}) == 0
+
+
+def test_unsupported_operator(collection):
+    with pytest.raises(ValueError):
+        collection.find_one({"heartbeat": {"$gt": 1}})
+
+
+def test_insert_many(database):
+    collection = database["PersonCounters"]
+    collection.insert_many([{"id": "A", "count": 1}, {"id": "B", "count": 2}])
+    collection.insert_one({"id": "C", "count": 3})
+    assert sortedDocuments(collection.find({})) == [{"id": "A", "count": 1}, {"id": "B", "count": 2},
+                                                    {"id": "C", "count": 3}]
+
+
+def test_update_one_set(collection):
+    assert collection.update_one({"id": "A"}, {"$set": {"heartbeat": 10, "levels": [{"level": 400}]}}) == 1
+    assert strip(collection.find_one({"id": "A"})) == {"id": "A", "key": "ka", "type": "co2", "heartbeat": 10,
+                                                       "levels": [{"level": 400}]}
+
+    # Updating only the first matching document
+    assert collection.update_one({"type": "co2"}, {"$set": {"online": True}}) == 1
+    assert collection.count_documents({"online": True}) == 1
+
+    assert collection.update_one({"id": "Z"}, {"$set": {"heartbeat": 10}}) == 0
+
+
+def test_update_one_indexed_field(collection):
+    collection.update_one({"id": "A"}, {"$set": {"key": "new"}})
+    assert strip(collection.find_one({"key": "new"}))["id"] == "A"
+    assert collection.find_one({"key": "ka"}) is None
+
+
+def test_update_one_concurrent_fields(collection):
+
+    # Updating different fields of the same document from multiple threads may not lose any field
+    def update(field):
+        for i in range(20):
+            collection.update_one({"id": "A"}, {"$set": {field: i}})
+
+    threads = [threading.Thread(target=update, args=(f"field{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    document = collection.find_one({"id": "A"})
+    assert all(document[f"field{i}"] == 19 for i in range(4))
+
+
+def test_delete_one(collection):
+    collection.delete_one({"type": "co2"})
+    assert collection.count_documents({"type": "co2"}) == 1
+    assert collection.count_documents({}) == 2
+
+
+def test_delete_many(collection):
+    collection.delete_many({"id": {"$in": ["A", "B"]}})
+    assert [document["id"] for document in sortedDocuments(collection.find({}))] == ["C"]
+
+    collection.delete_many({})
+    assert collection.count_documents({}) == 0
+
+
+def test_unique_index(collection):
+    collection.create_index(["id"], unique=True)
+
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"id": "A", "key": "other", "type": "co2"})
+
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_many([{"id": "D", "key": "kd"}, {"id": "B", "key": "other"}])
+
+
+def test_unique_index_existing_duplicates(collection):
+    collection.insert_one({"id": "A", "key": "other", "type": "co2"})
+
+    with pytest.raises(DuplicateKeyError):
+        collection.create_index(["id"], unique=True)
+
+    assert findDuplicates(collection, "id") == {"A": 2}
+
+
+def test_compound_index(database):
+    collection = database["Alerts"]
+    collection.create_index(["id", "rule", "active"])
+    collection.insert_one({"id": "A", "rule": "R", "active": True})
+    collection.insert_one({"id": "A", "rule": "R", "active": False})
+    assert collection.count_documents({"id": "A", "rule": "R", "active": True}) == 1